@@ -11,7 +11,9 @@ mobyclaw Dashboard Server
 
 import http.server
 import json
+import queue
 import sqlite3
+import stat
 import subprocess
 import os
 import re
@@ -19,17 +21,188 @@ import uuid
 import threading
 import time
 import math
-from datetime import datetime, timezone
+import shutil
+import functools
+import gzip
+import heapq
+import io
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlparse, parse_qs
 
+try:
+    import orjson
+except ImportError:  # optional speedup, falls back to stdlib json
+    orjson = None
+
 PORT = int(os.environ.get("DASHBOARD_PORT", 7777))
 MOBY_DIR = os.environ.get("MOBYCLAW_DATA", "/data/.mobyclaw")
 STATIC_DIR = os.environ.get("STATIC_DIR", "/app/static")
 DB_PATH = f"{MOBY_DIR}/data/tasks.db"
 GATEWAY_URL = os.environ.get("GATEWAY_URL", "http://gateway:3000")
 SOUL_YAML_PATH = f"{MOBY_DIR}/soul.yaml"
+MEMORY_PATH = f"{MOBY_DIR}/MEMORY.md"
+SELF_MODEL_PATH = f"{MOBY_DIR}/SELF.md"
+TUNNEL_INFO_PATH = f"{MOBY_DIR}/data/tunnel-info.json"
 AUTO_RETRY_INTERVAL = int(os.environ.get("AUTO_RETRY_INTERVAL", 300))  # 5 min
 DEFAULT_CONTEXT_BUDGET = int(os.environ.get("CONTEXT_BUDGET_TOKENS", 1500))  # ~1500 tokens
+MAX_USAGE_STATS_DAYS = 3650  # longest /api/usage/stats window
+DB_OPTIMIZE_INTERVAL = int(os.environ.get("DB_OPTIMIZE_INTERVAL", 900))  # 15 min
+
+# Per-connection settings. synchronous=NORMAL is durable under WAL (fsync at checkpoint only).
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",  # 256 MiB
+    "cache_size=-65536",    # 64 MiB
+    "busy_timeout=5000",
+)
+# Per-connection prepared statement cache; filter combinations and IN-list sizes
+# each get their own entry, so leave headroom over sqlite3's default of 128
+SQLITE_CACHED_STATEMENTS = 512
+
+# ─── JSON Encoding ──────────────────────────────────────────
+
+def json_dumps(obj):
+    """Encode a value for storage in a SQLite TEXT column."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def json_loads(data):
+    """Decode JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_response(data):
+    """Encode an API response body as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=(
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+GZIP_MIN_SIZE = 1024  # smaller bodies aren't worth the compression round-trip
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header value allows gzip.
+    Codings compare case-insensitively and q=0 refuses one; "*" covers gzip
+    unless gzip is listed itself."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+# ─── Caching ────────────────────────────────────────────────
+
+def ttl_cache(seconds, maxsize=64):
+    """Memoize a function per argument tuple for `seconds`.
+    Concurrent misses for the same arguments share one call: the first caller
+    computes while the others wait on a per-key lock and then reuse its result.
+    At most `maxsize` argument tuples are kept; the least recently used go first.
+    `fn.cache_clear()` drops every entry, e.g. after a write changes the result.
+    Cached values are shared between callers and must not be mutated."""
+    def decorator(fn):
+        entries = OrderedDict()  # args -> (computed at, value), least recently used first
+        key_locks = {}  # args -> lock held while that entry is being computed
+        generation = [0]  # bumped by cache_clear so in-flight results aren't stored
+        lock = threading.Lock()
+
+        def lookup(args):
+            with lock:
+                hit = entries.get(args)
+                if hit:
+                    entries.move_to_end(args)
+            if hit and time.monotonic() - hit[0] < seconds:
+                return hit
+            return None
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            hit = lookup(args)
+            if hit:
+                return hit[1]
+            with lock:
+                key_lock = key_locks.setdefault(args, threading.Lock())
+            with key_lock:
+                # Another caller may have filled the entry while we waited
+                hit = lookup(args)
+                if hit:
+                    return hit[1]
+                try:
+                    with lock:
+                        gen = generation[0]
+                    now = time.monotonic()
+                    value = fn(*args)
+                    with lock:
+                        # A clear while computing means value may predate a write
+                        if generation[0] == gen:
+                            entries[args] = (now, value)
+                            entries.move_to_end(args)
+                            while len(entries) > maxsize:
+                                entries.popitem(last=False)
+                finally:
+                    with lock:
+                        key_locks.pop(args, None)
+            return value
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                generation[0] += 1
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+# ─── Timestamps ─────────────────────────────────────────────
+
+_iso_second = (0, "")  # (epoch second, "YYYY-MM-DDTHH:MM:SS")
+
+def now_iso():
+    """Current UTC time as an ISO 8601 string with microseconds.
+    The date/time prefix is formatted at most once per second."""
+    global _iso_second
+    sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_sec, prefix = _iso_second
+    if cached_sec != sec:
+        prefix = datetime.fromtimestamp(sec, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        _iso_second = (sec, prefix)
+    return f"{prefix}.{usec:06d}+00:00"
+
+
+_today = (None, "")  # (UTC day number since the epoch, "YYYY-MM-DD")
+
+def today_str():
+    """Current UTC date as YYYY-MM-DD, formatted once per day."""
+    global _today
+    day = int(time.time()) // 86400
+    cached_day, text = _today
+    if cached_day != day:
+        text = datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%d")
+        _today = (day, text)
+    return text
 
 # ─── SQLite Task DB ────────────────────────────────────────
 
@@ -37,8 +210,10 @@ def init_db():
     """Create the tasks database and tables."""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
     conn.execute("PRAGMA foreign_keys=ON")
+    has_task_tags = conn.execute("SELECT 1 FROM sqlite_master WHERE name='task_tags'").fetchone()
 
     conn.executescript("""
         CREATE TABLE IF NOT EXISTS tasks (
@@ -57,13 +232,23 @@ def init_db():
             retry_count INTEGER DEFAULT 0,
             max_retries INTEGER DEFAULT 3,
             last_error TEXT,
-            metadata TEXT DEFAULT '{}'
+            metadata TEXT DEFAULT '{}',
+            priority_rank INTEGER GENERATED ALWAYS AS (
+                CASE priority WHEN 'critical' THEN 0 WHEN 'high' THEN 1 WHEN 'medium' THEN 2 ELSE 3 END
+            ) VIRTUAL
         );
 
         CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
         CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
         CREATE INDEX IF NOT EXISTS idx_tasks_parent ON tasks(parent_id);
-        CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(due_date);
+        -- (due_date, status) answers the overdue count from the index alone
+        CREATE INDEX IF NOT EXISTS idx_tasks_due_status ON tasks(due_date, status);
+        DROP INDEX IF EXISTS idx_tasks_due;
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed_at);
+        -- Small partial indexes for the background retry scan and the blocked-tasks view
+        CREATE INDEX IF NOT EXISTS idx_tasks_failed ON tasks(status, retry_count, max_retries) WHERE status='failed';
+        CREATE INDEX IF NOT EXISTS idx_tasks_deps_active ON tasks(id)
+            WHERE depends_on != '[]' AND status NOT IN ('done','cancelled');
 
         CREATE TABLE IF NOT EXISTS task_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -74,6 +259,52 @@ def init_db():
             timestamp TEXT NOT NULL
         );
 
+        CREATE INDEX IF NOT EXISTS idx_history_task ON task_history(task_id, timestamp);
+
+        -- One updated_<column> history row per changed column, written inside the UPDATE
+        -- itself. Retries bump retry_count and log their own 'retry' row instead.
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_history AFTER UPDATE ON tasks
+        WHEN NEW.retry_count IS OLD.retry_count BEGIN
+            INSERT INTO task_history (task_id, action, old_value, new_value, timestamp)
+            SELECT NEW.id, 'updated_' || col, old_value, new_value, NEW.updated_at FROM (
+                SELECT 'title' AS col, OLD.title AS old_value, NEW.title AS new_value
+                UNION ALL SELECT 'description', OLD.description, NEW.description
+                UNION ALL SELECT 'status', OLD.status, NEW.status
+                UNION ALL SELECT 'priority', OLD.priority, NEW.priority
+                UNION ALL SELECT 'tags', OLD.tags, NEW.tags
+                UNION ALL SELECT 'parent_id', OLD.parent_id, NEW.parent_id
+                UNION ALL SELECT 'depends_on', OLD.depends_on, NEW.depends_on
+                UNION ALL SELECT 'due_date', OLD.due_date, NEW.due_date
+                UNION ALL SELECT 'max_retries', OLD.max_retries, NEW.max_retries
+                UNION ALL SELECT 'last_error', OLD.last_error, NEW.last_error
+                UNION ALL SELECT 'metadata', OLD.metadata, NEW.metadata
+            ) WHERE old_value IS NOT new_value;
+        END;
+
+        -- One row per (task, tag) so tag filters are an index seek; kept in sync by triggers
+        CREATE TABLE IF NOT EXISTS task_tags (
+            task_id TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (task_id, tag)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_task_tags_tag ON task_tags(tag);
+
+        CREATE TRIGGER IF NOT EXISTS trg_task_tags_insert AFTER INSERT ON tasks BEGIN
+            INSERT OR IGNORE INTO task_tags (task_id, tag)
+            SELECT NEW.id, value FROM json_each(CASE WHEN json_valid(NEW.tags) THEN NEW.tags ELSE '[]' END);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_task_tags_update AFTER UPDATE OF tags ON tasks BEGIN
+            DELETE FROM task_tags WHERE task_id = OLD.id;
+            INSERT OR IGNORE INTO task_tags (task_id, tag)
+            SELECT NEW.id, value FROM json_each(CASE WHEN json_valid(NEW.tags) THEN NEW.tags ELSE '[]' END);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_task_tags_delete AFTER DELETE ON tasks BEGIN
+            DELETE FROM task_tags WHERE task_id = OLD.id;
+        END;
+
         CREATE TABLE IF NOT EXISTS conversations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT NOT NULL,
@@ -84,8 +315,11 @@ def init_db():
             message_count INTEGER DEFAULT 0
         );
 
-        CREATE INDEX IF NOT EXISTS idx_conv_topics ON conversations(topics);
         CREATE INDEX IF NOT EXISTS idx_conv_timestamp ON conversations(timestamp);
+        -- Channel-filtered listing in timestamp order, and per-channel counts
+        CREATE INDEX IF NOT EXISTS idx_conv_channel_ts ON conversations(channel, timestamp);
+        -- topics is only ever searched by substring, which no B-tree can serve
+        DROP INDEX IF EXISTS idx_conv_topics;
 
         CREATE TABLE IF NOT EXISTS usage (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -102,7 +336,10 @@ def init_db():
             model TEXT DEFAULT ''
         );
 
-        CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage(timestamp);
+        -- Serves time-range scans, ORDER BY timestamp and the channel/model groupings;
+        -- supersedes the old single-column timestamp index
+        CREATE INDEX IF NOT EXISTS idx_usage_ts_channel_model ON usage(timestamp, channel, model);
+        DROP INDEX IF EXISTS idx_usage_timestamp;
         CREATE INDEX IF NOT EXISTS idx_usage_channel ON usage(channel);
 
         CREATE TABLE IF NOT EXISTS lessons (
@@ -119,101 +356,243 @@ def init_db():
 
         CREATE INDEX IF NOT EXISTS idx_lessons_category ON lessons(category);
     """)
+    task_columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(tasks)")}
+    if "priority_rank" not in task_columns:
+        # Databases created before priority_rank: add it so list ordering can use an index
+        conn.execute("""
+            ALTER TABLE tasks ADD COLUMN priority_rank INTEGER GENERATED ALWAYS AS (
+                CASE priority WHEN 'critical' THEN 0 WHEN 'high' THEN 1 WHEN 'medium' THEN 2 ELSE 3 END
+            ) VIRTUAL
+        """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_rank_created ON tasks(priority_rank, created_at DESC)")
+    conversations_fts = _init_conversations_fts(conn)
+    if not has_task_tags:
+        # Backfill tags for tasks created before the task_tags table existed
+        conn.execute("""
+            INSERT OR IGNORE INTO task_tags (task_id, tag)
+            SELECT t.id, j.value FROM tasks t,
+                json_each(CASE WHEN json_valid(t.tags) THEN t.tags ELSE '[]' END) j
+        """)
     conn.commit()
+    conn.execute("PRAGMA optimize")
     conn.close()
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    global _pool, _conversations_fts
+    _pool = SQLitePool(DB_PATH)
+    _conversations_fts = conversations_fts
+
+
+def _init_conversations_fts(conn):
+    """Create the FTS5 index over conversations. Returns False when this SQLite
+    build lacks FTS5 or the trigram tokenizer, leaving search on LIKE."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='conversations_fts'").fetchone()
+    try:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+                summary, topics, key_facts,
+                content='conversations', content_rowid='id', tokenize='trigram'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_insert AFTER INSERT ON conversations BEGIN
+                INSERT INTO conversations_fts (rowid, summary, topics, key_facts)
+                VALUES (NEW.id, NEW.summary, NEW.topics, NEW.key_facts);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_delete AFTER DELETE ON conversations BEGIN
+                INSERT INTO conversations_fts (conversations_fts, rowid, summary, topics, key_facts)
+                VALUES ('delete', OLD.id, OLD.summary, OLD.topics, OLD.key_facts);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_update AFTER UPDATE ON conversations BEGIN
+                INSERT INTO conversations_fts (conversations_fts, rowid, summary, topics, key_facts)
+                VALUES ('delete', OLD.id, OLD.summary, OLD.topics, OLD.key_facts);
+                INSERT INTO conversations_fts (rowid, summary, topics, key_facts)
+                VALUES (NEW.id, NEW.summary, NEW.topics, NEW.key_facts);
+            END;
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"[db] FTS5 unavailable, conversation search uses LIKE: {e}")
+        return False
+    if not exists:
+        # Index conversations logged before the FTS table existed
+        conn.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+    return True
+
+
+class SQLitePool:
+    """Long-lived SQLite connections: one writer behind a lock, plus a queue of readers.
+    WAL mode lets the readers run concurrently with the writer."""
+
+    def __init__(self, path, readers=8):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect(isolation_level=None)  # transactions are explicit, see write()
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+    def _connect(self, isolation_level=""):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=isolation_level,
+                               cached_statements=SQLITE_CACHED_STATEMENTS)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def read(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """Run the block as a single IMMEDIATE transaction on the writer connection."""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+                self._writer.execute("COMMIT")
+            except BaseException:
+                # Also covers a failed COMMIT, which would otherwise leave the
+                # writer inside a transaction and wedge every later BEGIN
+                if self._writer.in_transaction:
+                    self._writer.execute("ROLLBACK")
+                raise
+
+
+_pool = None
+_conversations_fts = False
+
+def get_db(readonly=False):
+    """Borrow a pooled connection: `with get_db() as conn:` for writes,
+    `with get_db(readonly=True) as conn:` for SELECT-only work."""
+    return _pool.read() if readonly else _pool.write()
+
+def start_db_optimize_thread():
+    """Start background thread that periodically refreshes query planner stats."""
+    def optimize_loop():
+        while True:
+            time.sleep(DB_OPTIMIZE_INTERVAL)
+            try:
+                with get_db() as conn:
+                    conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                print(f"[db-optimize] Error: {e}")
+
+    thread = threading.Thread(target=optimize_loop, daemon=True)
+    thread.start()
 
 # ─── Task CRUD ──────────────────────────────────────────────
 
+TASK_COLUMNS = (
+    "id", "title", "description", "status", "priority", "tags", "parent_id", "depends_on",
+    "due_date", "created_at", "updated_at", "completed_at", "retry_count", "max_retries",
+    "last_error", "metadata",
+)
+_TASK_COLUMN_LIST = ", ".join(TASK_COLUMNS)
+# Fixed statement prefixes so every filter shape maps to one cached prepared statement
+_TASKS_SELECT = f"SELECT {_TASK_COLUMN_LIST} FROM tasks WHERE 1=1"
+_TASKS_ORDER = " ORDER BY priority_rank, created_at DESC"
+_INSERT_TASK_SQL = """
+    INSERT INTO tasks (id, title, description, status, priority, tags, parent_id, depends_on, due_date, created_at, updated_at, max_retries, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_HISTORY_SQL = "INSERT INTO task_history (task_id, action, old_value, new_value, timestamp) VALUES (?, ?, ?, ?, ?)"
+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def _write_task_row(conn, sql, params, task_id):
+    """Run an INSERT/UPDATE on tasks and return the written row as a dict,
+    via RETURNING when SQLite supports it instead of a second SELECT.
+    Returns None when the statement matched no row."""
+    if _HAS_RETURNING:
+        rows = conn.execute(f"{sql} RETURNING {_TASK_COLUMN_LIST}", params).fetchall()
+        return dict(rows[0]) if rows else None
+    if conn.execute(sql, params).rowcount == 0:
+        return None
+    row = conn.execute(f"SELECT {_TASK_COLUMN_LIST} FROM tasks WHERE id=?", (task_id,)).fetchone()
+    return dict(row)
+
 def create_task(data):
-    conn = get_db()
     task_id = f"task_{uuid.uuid4().hex[:12]}"
-    now = datetime.now(timezone.utc).isoformat()
-    conn.execute("""
-        INSERT INTO tasks (id, title, description, status, priority, tags, parent_id, depends_on, due_date, created_at, updated_at, max_retries, metadata)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        task_id,
-        data.get("title", "Untitled"),
-        data.get("description", ""),
-        data.get("status", "todo"),
-        data.get("priority", "medium"),
-        json.dumps(data.get("tags", [])),
-        data.get("parent_id"),
-        json.dumps(data.get("depends_on", [])),
-        data.get("due_date"),
-        now, now,
-        data.get("max_retries", 3),
-        json.dumps(data.get("metadata", {}))
-    ))
-    conn.execute("INSERT INTO task_history (task_id, action, new_value, timestamp) VALUES (?, 'created', ?, ?)",
-                 (task_id, json.dumps(data), now))
-    conn.commit()
-    task = dict(conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone())
-    conn.close()
+    now = now_iso()
+    with get_db() as conn:
+        task = _write_task_row(conn, _INSERT_TASK_SQL, (
+            task_id,
+            data.get("title", "Untitled"),
+            data.get("description", ""),
+            data.get("status", "todo"),
+            data.get("priority", "medium"),
+            json_dumps(data.get("tags", [])),
+            data.get("parent_id"),
+            json_dumps(data.get("depends_on", [])),
+            data.get("due_date"),
+            now, now,
+            data.get("max_retries", 3),
+            json_dumps(data.get("metadata", {}))
+        ), task_id)
+        conn.execute(_INSERT_HISTORY_SQL, (task_id, "created", None, json_dumps(data), now))
+    invalidate_stats()
+    if task["status"] == "failed":
+        _retry_wakeup.set()
     return task
 
 def update_task(task_id, data):
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-
-    old = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
-    if not old:
-        conn.close()
-        return None
-
-    # Dependency check: block transition to in_progress/done if deps not met
-    if "status" in data and data["status"] in ("in_progress", "done"):
-        old_dict = dict(old)
-        deps = json.loads(old_dict.get("depends_on", "[]"))
-        if deps:
-            dep_check = check_dependencies(task_id)
-            if dep_check and not dep_check["satisfied"]:
-                conn.close()
-                blocking_names = [b["title"] for b in dep_check["blocking"]]
-                return {
-                    "error": "blocked_by_dependencies",
-                    "message": f"Cannot set status to '{data['status']}': blocked by {len(dep_check['blocking'])} unfinished dependencies",
-                    "blocking": dep_check["blocking"]
-                }
-
-    fields = []
-    values = []
-    for key in ["title", "description", "status", "priority", "tags", "parent_id", "depends_on", "due_date", "max_retries", "last_error", "metadata"]:
-        if key in data:
-            val = data[key]
-            if key in ("tags", "depends_on", "metadata") and isinstance(val, (list, dict)):
-                val = json.dumps(val)
-            fields.append(f"{key}=?")
-            values.append(val)
-            conn.execute("INSERT INTO task_history (task_id, action, old_value, new_value, timestamp) VALUES (?, ?, ?, ?, ?)",
-                        (task_id, f"updated_{key}", str(dict(old).get(key)), str(val), now))
-
-    if "status" in data:
-        if data["status"] in ("done", "failed", "cancelled"):
-            fields.append("completed_at=?")
-            values.append(now)
-        elif data["status"] == "in_progress" and dict(old).get("status") != "in_progress":
-            fields.append("completed_at=?")
-            values.append(None)
-
-    fields.append("updated_at=?")
-    values.append(now)
-    values.append(task_id)
-
-    conn.execute(f"UPDATE tasks SET {', '.join(fields)} WHERE id=?", values)
-    conn.commit()
-    task = dict(conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone())
-    conn.close()
+    now = now_iso()
+
+    with get_db() as conn:
+        old = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
+        if not old:
+            return None
+        old = dict(old)
+
+        # Dependency check: block transition to in_progress/done if deps not met
+        if "status" in data and data["status"] in ("in_progress", "done"):
+            deps = json_loads(old.get("depends_on") or "[]")
+            if deps:
+                dep_check = summarize_dependencies(deps, fetch_dependency_map(conn, deps))
+                if not dep_check["satisfied"]:
+                    blocking_names = [b["title"] for b in dep_check["blocking"]]
+                    return {
+                        "error": "blocked_by_dependencies",
+                        "message": f"Cannot set status to '{data['status']}': blocked by {len(dep_check['blocking'])} unfinished dependencies",
+                        "blocking": dep_check["blocking"]
+                    }
+
+        fields = []
+        values = []
+        for key in ["title", "description", "status", "priority", "tags", "parent_id", "depends_on", "due_date", "max_retries", "last_error", "metadata"]:
+            if key in data:
+                val = data[key]
+                if key in ("tags", "depends_on", "metadata") and isinstance(val, (list, dict)):
+                    val = json_dumps(val)
+                fields.append(f"{key}=?")
+                values.append(val)
+
+        if "status" in data:
+            if data["status"] in ("done", "failed", "cancelled"):
+                fields.append("completed_at=?")
+                values.append(now)
+            elif data["status"] == "in_progress" and old.get("status") != "in_progress":
+                fields.append("completed_at=?")
+                values.append(None)
+
+        fields.append("updated_at=?")
+        values.append(now)
+        values.append(task_id)
+
+        # task_history rows are written by the trg_tasks_history trigger
+        task = _write_task_row(conn, f"UPDATE tasks SET {', '.join(fields)} WHERE id=?", values, task_id)
+    invalidate_stats()
+    if data.get("status") == "failed":
+        _retry_wakeup.set()
     return task
 
 def get_tasks(filters=None):
-    conn = get_db()
-    query = "SELECT * FROM tasks WHERE 1=1"
+    query = _TASKS_SELECT
     params = []
 
     if filters:
@@ -229,85 +608,90 @@ def get_tasks(filters=None):
             query += " AND parent_id=?"
             params.append(filters["parent_id"])
         if "tag" in filters:
-            query += " AND tags LIKE ?"
-            params.append(f'%"{filters["tag"]}"%')
+            query += " AND id IN (SELECT task_id FROM task_tags WHERE tag=?)"
+            params.append(filters["tag"])
 
-    query += " ORDER BY CASE priority WHEN 'critical' THEN 0 WHEN 'high' THEN 1 WHEN 'medium' THEN 2 WHEN 'low' THEN 3 END, created_at DESC"
+    query += _TASKS_ORDER
 
-    tasks = [dict(row) for row in conn.execute(query, params).fetchall()]
-    conn.close()
+    with get_db(readonly=True) as conn:
+        # Plain tuples are cheaper than sqlite3.Row when every row becomes a dict anyway
+        cur = conn.cursor()
+        cur.row_factory = None
+        tasks = [dict(zip(TASK_COLUMNS, row)) for row in cur.execute(query, params)]
     return tasks
 
 def get_task(task_id):
-    conn = get_db()
-    row = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
-    history = [dict(h) for h in conn.execute("SELECT * FROM task_history WHERE task_id=? ORDER BY timestamp DESC LIMIT 20", (task_id,)).fetchall()]
-    subtasks = [dict(s) for s in conn.execute("SELECT * FROM tasks WHERE parent_id=?", (task_id,)).fetchall()]
-    conn.close()
-    if not row:
-        return None
-    result = dict(row)
+    with get_db(readonly=True) as conn:
+        # The task and its subtasks come back from one statement; split them by id.
+        # Subtasks are listed in creation order (rowid breaks timestamp ties)
+        result = None
+        subtasks = []
+        for row in conn.execute(f"SELECT {_TASK_COLUMN_LIST} FROM tasks WHERE id=? OR parent_id=? "
+                                "ORDER BY created_at, rowid", (task_id, task_id)):
+            if row["id"] == task_id:
+                result = dict(row)
+            else:
+                subtasks.append(dict(row))
+        if result is None:
+            return None
+        history = [dict(h) for h in conn.execute("SELECT * FROM task_history WHERE task_id=? ORDER BY timestamp DESC LIMIT 20", (task_id,)).fetchall()]
     result["history"] = history
     result["subtasks"] = subtasks
     return result
 
 def delete_task(task_id):
-    conn = get_db()
-    conn.execute("DELETE FROM task_history WHERE task_id=?", (task_id,))
-    conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-    conn.commit()
-    conn.close()
-
-def retry_task(task_id):
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    task = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
-    if not task:
-        conn.close()
-        return None
-    task = dict(task)
-    if task["retry_count"] >= task["max_retries"]:
-        conn.close()
+    with get_db() as conn:
+        conn.execute("DELETE FROM task_history WHERE task_id=?", (task_id,))
+        conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
+    invalidate_stats()
+
+def _retry_task_with_conn(conn, task_id, now):
+    """retry_task() inside the caller's write transaction."""
+    # The retry budget is checked by the UPDATE itself; only a miss needs a second look
+    result = _write_task_row(conn, "UPDATE tasks SET status='todo', retry_count=retry_count+1, updated_at=?, completed_at=NULL "
+                                   "WHERE id=? AND retry_count < max_retries",
+                             (now, task_id), task_id)
+    if result is None:
+        task = conn.execute("SELECT retry_count, max_retries FROM tasks WHERE id=?", (task_id,)).fetchone()
+        if not task:
+            return None
         return {"error": "Max retries exceeded", "retry_count": task["retry_count"], "max_retries": task["max_retries"]}
 
-    conn.execute("UPDATE tasks SET status='todo', retry_count=retry_count+1, updated_at=?, completed_at=NULL WHERE id=?", (now, task_id))
-    conn.execute("INSERT INTO task_history (task_id, action, old_value, new_value, timestamp) VALUES (?, 'retry', ?, ?, ?)",
-                (task_id, str(task["retry_count"]), str(task["retry_count"] + 1), now))
-    conn.commit()
-    result = dict(conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone())
-    conn.close()
+    conn.execute(_INSERT_HISTORY_SQL, (task_id, "retry", str(result["retry_count"] - 1), str(result["retry_count"]), now))
     return result
 
-# ─── Task Dependency Checking ───────────────────────────────
+def retry_task(task_id):
+    with get_db() as conn:
+        result = _retry_task_with_conn(conn, task_id, now_iso())
+    invalidate_stats()
+    return result
 
-def check_dependencies(task_id):
-    """Check if all dependencies of a task are satisfied (done).
-    Returns {"satisfied": bool, "blocking": [...], "total": int, "done": int}"""
-    conn = get_db()
-    task = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
-    if not task:
-        conn.close()
-        return None
+# ─── Task Dependency Checking ───────────────────────────────
 
-    deps = json.loads(dict(task).get("depends_on", "[]"))
-    if not deps:
-        conn.close()
-        return {"satisfied": True, "blocking": [], "total": 0, "done": 0}
+def fetch_dependency_map(conn, dep_ids):
+    """Look up every task in dep_ids with one query. Returns {id: (title, status)}."""
+    dep_ids = list(set(dep_ids))
+    if not dep_ids:
+        return {}
+    placeholders = ",".join("?" * len(dep_ids))
+    rows = conn.execute(
+        f"SELECT id, title, status FROM tasks WHERE id IN ({placeholders})", dep_ids
+    ).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
 
+def summarize_dependencies(deps, dep_map):
+    """Build the check_dependencies() result for a depends_on list from a prefetched dep_map."""
     blocking = []
     done_count = 0
     for dep_id in deps:
-        dep = conn.execute("SELECT id, title, status FROM tasks WHERE id=?", (dep_id,)).fetchone()
-        if dep:
-            dep = dict(dep)
-            if dep["status"] == "done":
-                done_count += 1
-            else:
-                blocking.append({"id": dep["id"], "title": dep["title"], "status": dep["status"]})
-        else:
+        dep = dep_map.get(dep_id)
+        if dep is None:
             blocking.append({"id": dep_id, "title": "(not found)", "status": "missing"})
+        elif dep[1] == "done":
+            done_count += 1
+        else:
+            blocking.append({"id": dep_id, "title": dep[0], "status": dep[1]})
 
-    conn.close()
     return {
         "satisfied": len(blocking) == 0,
         "blocking": blocking,
@@ -315,54 +699,90 @@ def check_dependencies(task_id):
         "done": done_count
     }
 
+def check_dependencies(task_id, dep_map=None):
+    """Check if all dependencies of a task are satisfied (done).
+    Returns {"satisfied": bool, "blocking": [...], "total": int, "done": int}
+    Pass dep_map (from fetch_dependency_map) to share one lookup across many tasks."""
+    with get_db(readonly=True) as conn:
+        task = conn.execute("SELECT depends_on FROM tasks WHERE id=?", (task_id,)).fetchone()
+        if not task:
+            return None
+
+        deps = json_loads(task[0] or "[]")
+        if dep_map is None:
+            dep_map = fetch_dependency_map(conn, deps)
+
+    return summarize_dependencies(deps, dep_map)
+
 def get_blocked_tasks():
     """Return all tasks that have unsatisfied dependencies."""
-    conn = get_db()
-    tasks_with_deps = conn.execute(
-        "SELECT id, title, status, depends_on FROM tasks WHERE depends_on != '[]' AND status NOT IN ('done','cancelled')"
-    ).fetchall()
-    conn.close()
+    with get_db(readonly=True) as conn:
+        tasks_with_deps = [
+            (r[0], r[1], r[2], json_loads(r[3]))
+            for r in conn.execute(
+                "SELECT id, title, status, depends_on FROM tasks WHERE depends_on != '[]' AND status NOT IN ('done','cancelled')"
+            ).fetchall()
+        ]
+        dep_map = fetch_dependency_map(conn, (d for t in tasks_with_deps for d in t[3]))
 
     blocked = []
-    for t in tasks_with_deps:
-        t = dict(t)
-        dep_check = check_dependencies(t["id"])
-        if dep_check and not dep_check["satisfied"]:
+    for task_id, title, status, deps in tasks_with_deps:
+        dep_check = summarize_dependencies(deps, dep_map)
+        if not dep_check["satisfied"]:
             blocked.append({
-                "id": t["id"],
-                "title": t["title"],
-                "status": t["status"],
+                "id": task_id,
+                "title": title,
+                "status": status,
                 "blocking": dep_check["blocking"]
             })
     return blocked
 
 # ─── Auto-Retry System ──────────────────────────────────────
 
+# Set whenever a task becomes 'failed' so the retry thread runs now instead of
+# at the end of its interval; the interval remains as a periodic safety sweep
+_retry_wakeup = threading.Event()
+
 def auto_retry_failed_tasks():
     """Automatically retry failed tasks that haven't exceeded max_retries.
     Called periodically by the retry thread."""
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    failed = conn.execute(
-        "SELECT * FROM tasks WHERE status='failed' AND retry_count < max_retries"
-    ).fetchall()
-    conn.close()
-
     retried = []
-    for task in failed:
-        task = dict(task)
-        result = retry_task(task["id"])
-        if result and "error" not in result:
-            retried.append({"id": task["id"], "title": task["title"], "retry_count": result["retry_count"]})
-            print(f"[auto-retry] Retried task: {task['title']} (attempt {result['retry_count']})")
-
+    # One write transaction (and one commit) for the whole batch
+    with get_db() as conn:
+        now = now_iso()
+        if _HAS_RETURNING:
+            # Retry every eligible task in a single set-based UPDATE
+            rows = conn.execute(
+                "UPDATE tasks SET status='todo', retry_count=retry_count+1, updated_at=?, completed_at=NULL "
+                "WHERE status='failed' AND retry_count < max_retries RETURNING id, title, retry_count",
+                (now,)
+            ).fetchall()
+            retried = [{"id": task_id, "title": title, "retry_count": count} for task_id, title, count in rows]
+            conn.executemany(_INSERT_HISTORY_SQL, [
+                (t["id"], "retry", str(t["retry_count"] - 1), str(t["retry_count"]), now) for t in retried
+            ])
+        else:
+            failed = conn.execute(
+                "SELECT id, title FROM tasks WHERE status='failed' AND retry_count < max_retries"
+            ).fetchall()
+            for task_id, title in failed:
+                result = _retry_task_with_conn(conn, task_id, now)
+                if result and "error" not in result:
+                    retried.append({"id": task_id, "title": title, "retry_count": result["retry_count"]})
+
+    if retried:
+        invalidate_stats()
+    for task in retried:
+        print(f"[auto-retry] Retried task: {task['title']} (attempt {task['retry_count']})")
     return retried
 
 def start_auto_retry_thread():
-    """Start background thread that periodically retries failed tasks."""
+    """Start background thread that retries failed tasks as soon as one fails,
+    and periodically as a sweep."""
     def retry_loop():
         while True:
-            time.sleep(AUTO_RETRY_INTERVAL)
+            if _retry_wakeup.wait(timeout=AUTO_RETRY_INTERVAL):
+                _retry_wakeup.clear()
             try:
                 retried = auto_retry_failed_tasks()
                 if retried:
@@ -374,14 +794,71 @@ def start_auto_retry_thread():
     thread.start()
     print(f"[auto-retry] Started (interval: {AUTO_RETRY_INTERVAL}s)")
 
+# ─── Atomic Writes ──────────────────────────────────────────
+
+# Serializes in-place rewrites of shared agent files (MEMORY.md, SELF.md, journal)
+# across handler threads so concurrent writers cannot interleave or lose updates
+_file_write_lock = threading.Lock()
+
+def atomic_write(path, data, backup_path=None):
+    """Replace `path` with `data` (str or bytes) so readers never see a partial file.
+    Writes a sibling temp file with the target's permissions, fdatasyncs it and
+    renames it over the target.
+    With backup_path, the previous version is kept there as a hard link (no copy),
+    or as a copy on filesystems that refuse hard links."""
+    if isinstance(data, str):
+        data = data.encode()
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        try:
+            # Keep the target's permissions; the temp file otherwise gets 0644 minus umask
+            target_st = safe_stat(path)
+            if target_st is not None:
+                os.fchmod(fd, stat.S_IMODE(target_st.st_mode))
+            os.write(fd, data)
+            os.fdatasync(fd)
+        finally:
+            os.close(fd)
+        if backup_path:
+            _backup_file(path, backup_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Never leave the temp file behind when the target wasn't replaced
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def _backup_file(path, backup_path):
+    """Keep the current contents of `path` at `backup_path` (no-op if `path` is missing)."""
+    # Link under a temp name first so an existing backup is swapped, not unlinked
+    link_path = f"{backup_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.link(path, link_path)
+    except FileNotFoundError:
+        return  # nothing to back up yet
+    except OSError:
+        # Some bind mounts and SMB shares refuse hard links (EPERM, ENOTSUP, EXDEV)
+        try:
+            shutil.copy2(path, backup_path)
+        except FileNotFoundError:
+            pass
+        return
+    try:
+        os.replace(link_path, backup_path)
+    except BaseException:
+        os.unlink(link_path)
+        raise
+
 # ─── Soul.yaml API ──────────────────────────────────────────
 
 def read_soul_yaml():
     """Read the agent's soul.yaml configuration."""
-    if not os.path.exists(SOUL_YAML_PATH):
+    content = read_text(SOUL_YAML_PATH)
+    if content is None:
         return {"error": "soul.yaml not found", "path": SOUL_YAML_PATH}
-    with open(SOUL_YAML_PATH, "r") as f:
-        content = f.read()
     return {"content": content, "path": SOUL_YAML_PATH, "size": len(content)}
 
 def write_soul_yaml(content):
@@ -389,144 +866,147 @@ def write_soul_yaml(content):
     if not content or not content.strip():
         return {"error": "Empty content not allowed"}
 
-    # Backup current
-    if os.path.exists(SOUL_YAML_PATH):
-        backup_path = f"{SOUL_YAML_PATH}.bak"
-        with open(SOUL_YAML_PATH, "r") as f:
-            old_content = f.read()
-        with open(backup_path, "w") as f:
-            f.write(old_content)
-
-    with open(SOUL_YAML_PATH, "w") as f:
-        f.write(content)
+    atomic_write(SOUL_YAML_PATH, content, backup_path=f"{SOUL_YAML_PATH}.bak")
 
     return {"ok": True, "path": SOUL_YAML_PATH, "size": len(content)}
 
 # ─── Conversation Indexing ──────────────────────────────────
 
-def log_conversation(data):
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    conn.execute("""
-        INSERT INTO conversations (timestamp, channel, summary, topics, key_facts, message_count)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        data.get("timestamp", now),
-        data.get("channel", ""),
-        data.get("summary", ""),
-        json.dumps(data.get("topics", [])),
-        json.dumps(data.get("key_facts", [])),
-        data.get("message_count", 0)
-    ))
-    conn.commit()
-    conn.close()
+_INSERT_CONVERSATION_SQL = """
+    INSERT INTO conversations (timestamp, channel, summary, topics, key_facts, message_count)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
 
-def search_conversations(query):
-    conn = get_db()
-    results = [dict(row) for row in conn.execute(
-        "SELECT * FROM conversations WHERE summary LIKE ? OR topics LIKE ? OR key_facts LIKE ? ORDER BY timestamp DESC LIMIT 20",
-        (f"%{query}%", f"%{query}%", f"%{query}%")
-    ).fetchall()]
-    conn.close()
-    return results
+def log_conversation(data):
+    with get_db() as conn:
+        now = now_iso()
+        conn.execute(_INSERT_CONVERSATION_SQL, (
+            data.get("timestamp", now),
+            data.get("channel", ""),
+            data.get("summary", ""),
+            json_dumps(data.get("topics", [])),
+            json_dumps(data.get("key_facts", [])),
+            data.get("message_count", 0)
+        ))
+    invalidate_stats()
+
+def search_conversations(query, limit=20):
+    """Case-insensitive substring search over summary, topics and key_facts."""
+    with get_db(readonly=True) as conn:
+        # Trigram tokens need at least 3 characters; shorter queries scan with LIKE
+        if _conversations_fts and len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = conn.execute(
+                "SELECT c.* FROM conversations c JOIN conversations_fts f ON f.rowid = c.id "
+                "WHERE conversations_fts MATCH ? ORDER BY c.timestamp DESC LIMIT ?",
+                (phrase, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM conversations WHERE summary LIKE ? OR topics LIKE ? OR key_facts LIKE ? ORDER BY timestamp DESC LIMIT ?",
+                (f"%{query}%", f"%{query}%", f"%{query}%", limit)
+            ).fetchall()
+    return [dict(row) for row in rows]
 
 # ─── Usage Tracking ─────────────────────────────────────────
 
+_INSERT_USAGE_SQL = """
+    INSERT INTO usage (timestamp, channel, session_id, input_tokens, output_tokens,
+                      cached_input_tokens, cached_write_tokens, context_length,
+                      context_limit, cost, model)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 def log_usage(data):
     """Log a single usage entry from a prompt response."""
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    conn.execute("""
-        INSERT INTO usage (timestamp, channel, session_id, input_tokens, output_tokens,
-                          cached_input_tokens, cached_write_tokens, context_length,
-                          context_limit, cost, model)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        data.get("timestamp", now),
-        data.get("channel", ""),
-        data.get("session_id", ""),
-        data.get("input_tokens", 0),
-        data.get("output_tokens", 0),
-        data.get("cached_input_tokens", 0),
-        data.get("cached_write_tokens", 0),
-        data.get("context_length", 0),
-        data.get("context_limit", 0),
-        data.get("cost", 0),
-        data.get("model", ""),
-    ))
-    conn.commit()
-    conn.close()
-
+    with get_db() as conn:
+        now = now_iso()
+        conn.execute(_INSERT_USAGE_SQL, (
+            data.get("timestamp", now),
+            data.get("channel", ""),
+            data.get("session_id", ""),
+            data.get("input_tokens", 0),
+            data.get("output_tokens", 0),
+            data.get("cached_input_tokens", 0),
+            data.get("cached_write_tokens", 0),
+            data.get("context_length", 0),
+            data.get("context_limit", 0),
+            data.get("cost", 0),
+            data.get("model", ""),
+        ))
+    invalidate_stats()
+
+@ttl_cache(60.0)
 def get_usage_stats(days=None, channel=None):
-    """Get usage statistics. Optionally filter by days or channel."""
-    conn = get_db()
-    where_parts = []
-    params = []
-
-    if days:
-        where_parts.append("timestamp >= datetime('now', ?)")
-        params.append(f"-{days} days")
-    if channel:
-        where_parts.append("channel = ?")
-        params.append(channel)
-
-    where = (" WHERE " + " AND ".join(where_parts)) if where_parts else ""
-
-    # Summary stats
-    summary = conn.execute(f"""
-        SELECT
-            COUNT(*) as total_requests,
-            COALESCE(SUM(input_tokens), 0) as total_input_tokens,
-            COALESCE(SUM(output_tokens), 0) as total_output_tokens,
-            COALESCE(SUM(cached_input_tokens), 0) as total_cached_tokens,
-            COALESCE(SUM(cost), 0) as total_cost,
-            COALESCE(AVG(cost), 0) as avg_cost_per_request,
-            COALESCE(AVG(input_tokens + output_tokens), 0) as avg_tokens_per_request
-        FROM usage{where}
-    """, params).fetchone()
-
-    # Daily breakdown
-    daily = [dict(row) for row in conn.execute(f"""
-        SELECT
-            DATE(timestamp) as date,
-            COUNT(*) as requests,
-            SUM(input_tokens) as input_tokens,
-            SUM(output_tokens) as output_tokens,
-            SUM(cached_input_tokens) as cached_tokens,
-            SUM(cost) as cost
-        FROM usage{where}
-        GROUP BY DATE(timestamp)
-        ORDER BY date DESC
-        LIMIT 30
-    """, params).fetchall()]
-
-    # By channel
-    by_channel = [dict(row) for row in conn.execute(f"""
-        SELECT
-            channel,
-            COUNT(*) as requests,
-            SUM(cost) as cost,
-            SUM(input_tokens) as input_tokens,
-            SUM(output_tokens) as output_tokens
-        FROM usage{where}
-        GROUP BY channel
-        ORDER BY cost DESC
-    """, params).fetchall()]
-
-    # By model
-    by_model = [dict(row) for row in conn.execute(f"""
-        SELECT
-            model,
-            COUNT(*) as requests,
-            SUM(cost) as cost,
-            SUM(input_tokens) as input_tokens,
-            SUM(output_tokens) as output_tokens
-        FROM usage{where}
-        GROUP BY model
-        ORDER BY cost DESC
-    """, params).fetchall()]
+    """Get usage statistics. Optionally filter by days or channel.
+    Results are cached per (days, channel) for a minute."""
+    with get_db(readonly=True) as conn:
+        where_parts = []
+        params = []
+
+        if days:
+            where_parts.append("timestamp >= datetime('now', ?)")
+            params.append(f"-{days} days")
+        if channel:
+            where_parts.append("channel = ?")
+            params.append(channel)
+
+        where = (" WHERE " + " AND ".join(where_parts)) if where_parts else ""
+
+        # Summary stats
+        summary = conn.execute(f"""
+            SELECT
+                COUNT(*) as total_requests,
+                COALESCE(SUM(input_tokens), 0) as total_input_tokens,
+                COALESCE(SUM(output_tokens), 0) as total_output_tokens,
+                COALESCE(SUM(cached_input_tokens), 0) as total_cached_tokens,
+                COALESCE(SUM(cost), 0) as total_cost,
+                COALESCE(AVG(cost), 0) as avg_cost_per_request,
+                COALESCE(AVG(input_tokens + output_tokens), 0) as avg_tokens_per_request
+            FROM usage{where}
+        """, params).fetchone()
+
+        # Daily breakdown
+        daily = [dict(row) for row in conn.execute(f"""
+            SELECT
+                DATE(timestamp) as date,
+                COUNT(*) as requests,
+                SUM(input_tokens) as input_tokens,
+                SUM(output_tokens) as output_tokens,
+                SUM(cached_input_tokens) as cached_tokens,
+                SUM(cost) as cost
+            FROM usage{where}
+            GROUP BY DATE(timestamp)
+            ORDER BY date DESC
+            LIMIT 30
+        """, params).fetchall()]
+
+        # By channel
+        by_channel = [dict(row) for row in conn.execute(f"""
+            SELECT
+                channel,
+                COUNT(*) as requests,
+                SUM(cost) as cost,
+                SUM(input_tokens) as input_tokens,
+                SUM(output_tokens) as output_tokens
+            FROM usage{where}
+            GROUP BY channel
+            ORDER BY cost DESC
+        """, params).fetchall()]
+
+        # By model
+        by_model = [dict(row) for row in conn.execute(f"""
+            SELECT
+                model,
+                COUNT(*) as requests,
+                SUM(cost) as cost,
+                SUM(input_tokens) as input_tokens,
+                SUM(output_tokens) as output_tokens
+            FROM usage{where}
+            GROUP BY model
+            ORDER BY cost DESC
+        """, params).fetchall()]
 
-    conn.close()
     return {
         "summary": dict(summary) if summary else {},
         "daily": daily,
@@ -536,112 +1016,126 @@ def get_usage_stats(days=None, channel=None):
 
 def get_usage_recent(limit=50):
     """Get recent usage entries."""
-    conn = get_db()
-    rows = [dict(row) for row in conn.execute(
-        "SELECT * FROM usage ORDER BY timestamp DESC LIMIT ?", (limit,)
-    ).fetchall()]
-    conn.close()
+    with get_db(readonly=True) as conn:
+        rows = [dict(row) for row in conn.execute(
+            "SELECT * FROM usage ORDER BY timestamp DESC LIMIT ?", (limit,)
+        ).fetchall()]
     return rows
 
 # ─── Lessons System ─────────────────────────────────────────
 
+_INSERT_LESSON_SQL = """
+    INSERT INTO lessons (lesson, category, severity, source, auto_detected, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
 def add_lesson(data):
-    conn = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    conn.execute("""
-        INSERT INTO lessons (lesson, category, severity, source, auto_detected, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        data.get("lesson", ""),
-        data.get("category", "general"),
-        data.get("severity", "info"),
-        data.get("source", ""),
-        1 if data.get("auto_detected") else 0,
-        now
-    ))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        now = now_iso()
+        conn.execute(_INSERT_LESSON_SQL, (
+            data.get("lesson", ""),
+            data.get("category", "general"),
+            data.get("severity", "info"),
+            data.get("source", ""),
+            1 if data.get("auto_detected") else 0,
+            now
+        ))
+    invalidate_stats()
 
 def get_lessons(category=None):
-    conn = get_db()
-    if category:
-        lessons = [dict(row) for row in conn.execute("SELECT * FROM lessons WHERE category=? ORDER BY created_at DESC", (category,)).fetchall()]
-    else:
-        lessons = [dict(row) for row in conn.execute("SELECT * FROM lessons ORDER BY created_at DESC").fetchall()]
-    conn.close()
+    with get_db(readonly=True) as conn:
+        if category:
+            lessons = [dict(row) for row in conn.execute("SELECT * FROM lessons WHERE category=? ORDER BY created_at DESC", (category,)).fetchall()]
+        else:
+            lessons = [dict(row) for row in conn.execute("SELECT * FROM lessons ORDER BY created_at DESC").fetchall()]
     return lessons
 
 # ─── Memory Compression ────────────────────────────────────
 
+# Finished "Active Task" journal entries, up to the next section header
+_ARCHIVE_RE = re.compile(rb'(## Active Task \([^)]+\)\n\*\*Status:\*\* (?:DONE|CANCELLED)\n.*?)(?=\n## |\Z)', re.DOTALL)
+_BLANK_RUN_RE = re.compile(rb'\n{3,}')
+
+def _split_archivable(buf):
+    """Scan MEMORY.md bytes once. Returns (count, archived block, remaining content) as bytes."""
+    archived = []
+    kept = []
+    pos = 0
+    for m in _ARCHIVE_RE.finditer(buf):
+        archived.append(m.group(0).strip() + b"\n\n")
+        kept.append(buf[pos:m.start()])
+        pos = m.end()
+    if not archived:
+        return 0, b"", b""
+    kept.append(buf[pos:])
+    return len(archived), b"".join(archived), b"".join(kept)
+
 def compress_memory():
     """Archive old completed tasks from MEMORY.md to dated archive."""
-    memory_path = f"{MOBY_DIR}/MEMORY.md"
+    # Read-modify-write of MEMORY.md: hold the file lock so a concurrent
+    # POST /api/memory cannot be overwritten with stale content
+    with _file_write_lock:
+        return _compress_memory_locked()
+
+def _compress_memory_locked():
+    memory_path = MEMORY_PATH
     archive_dir = f"{MOBY_DIR}/memory/archives"
     os.makedirs(archive_dir, exist_ok=True)
 
-    if not os.path.exists(memory_path):
+    # Read a snapshot rather than mmap it: other processes edit MEMORY.md on the
+    # shared volume, and a mapping truncated under us raises SIGBUS. The bytes
+    # regexes still avoid decoding unless there is something to archive
+    try:
+        with open(memory_path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
         return {"archived": 0, "message": "No MEMORY.md found"}
+    count, archived_content, new_content = _split_archivable(content)
 
-    with open(memory_path, "r") as f:
-        content = f.read()
-
-    pattern = r'(## Active Task \([^)]+\)\n\*\*Status:\*\* (?:DONE|CANCELLED)\n.*?)(?=\n## |\Z)'
-    matches = list(re.finditer(pattern, content, re.DOTALL))
-
-    if not matches:
+    if not count:
         return {"archived": 0, "message": "Nothing to archive"}
 
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    today = today_str()
     archive_path = f"{archive_dir}/{today}-tasks.md"
-    archived_content = ""
-    for m in matches:
-        archived_content += m.group(0).strip() + "\n\n"
 
-    with open(archive_path, "a") as f:
-        f.write(archived_content)
-
-    new_content = content
-    for m in reversed(matches):
-        new_content = new_content[:m.start()] + new_content[m.end():]
+    # One O_APPEND write keeps the appended block contiguous without buffered-file overhead
+    fd = os.open(archive_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, archived_content)
+    finally:
+        os.close(fd)
 
-    new_content = re.sub(r'\n{3,}', '\n\n', new_content)
+    new_content = _BLANK_RUN_RE.sub(b'\n\n', new_content)
 
-    with open(memory_path, "w") as f:
+    with open(memory_path, "wb") as f:
         f.write(new_content)
 
-    return {"archived": len(matches), "archive_file": archive_path}
+    return {"archived": count, "archive_file": archive_path}
 
 # ─── Context Window Optimizer ───────────────────────────────
 
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+_WORD_SPLIT_RE = re.compile(r'\W+')
+_SECTION_HEADER_RE = re.compile(r'^## ([^\n]*)', re.MULTILINE)
+
 def parse_memory_sections(content):
-    """Parse MEMORY.md into sections by ## headers."""
+    """Parse MEMORY.md into sections by ## headers.
+    Each section carries its token estimate as rendered ("## header\nbody")."""
+    headers = list(_SECTION_HEADER_RE.finditer(content))
     sections = []
-    lines = content.split("\n")
-    current_header = None
-    current_body = []
-
-    for line in lines:
-        if line.startswith("## "):
-            if current_header is not None:
-                sections.append({
-                    "header": current_header,
-                    "body": "\n".join(current_body).strip(),
-                })
-            current_header = line[3:].strip()
-            current_body = []
-        elif current_header is not None:
-            current_body.append(line)
-
-    if current_header is not None:
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(content)
+        header = m.group(1).strip()
+        body = content[m.end():end].strip()
         sections.append({
-            "header": current_header,
-            "body": "\n".join(current_body).strip(),
+            "header": header,
+            "body": body,
+            "tokens": (len(header) + len(body) + 4) // 4,  # estimate_tokens() without building the string
         })
-
     return sections
 
 
-def score_section(section, query_words, now_str):
+def score_section(section, query_words, today):
     """Score a memory section for relevance.
 
     Returns a numeric score (higher = more relevant).
@@ -664,7 +1158,8 @@ def score_section(section, query_words, now_str):
             return score  # Always included, no further scoring needed
 
     # --- Status-based scoring ---
-    if "in progress" in body:
+    in_progress = "in progress" in body
+    if in_progress:
         score += 200
     elif "status:** todo" in body or "status:** planned" in body:
         score += 100
@@ -676,7 +1171,7 @@ def score_section(section, query_words, now_str):
     # --- Section type scoring ---
     if "active task" in header:
         # Active tasks with IN PROGRESS are super important
-        if "in progress" in body:
+        if in_progress:
             score += 300
         else:
             score += 20  # Completed task journal entries
@@ -691,17 +1186,13 @@ def score_section(section, query_words, now_str):
 
     # --- Recency scoring ---
     # Extract dates from header or body (YYYY-MM-DD format)
-    date_matches = re.findall(r'(\d{4}-\d{2}-\d{2})', header + " " + section["body"][:200])
+    date_matches = _DATE_RE.findall(header + " " + section["body"][:200])
     if date_matches:
-        try:
-            latest = max(date_matches)
-            today = now_str[:10] if now_str else datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            if latest == today:
-                score += 50
-            elif latest >= (datetime.now(timezone.utc).strftime("%Y-%m-%d")):
-                score += 30
-        except:
-            pass
+        latest = max(date_matches)
+        if latest == today:
+            score += 50
+        elif latest >= today:
+            score += 30
 
     # --- Body size penalty (prefer concise sections) ---
     body_len = len(section["body"])
@@ -724,26 +1215,27 @@ def bm25_scores(sections, query_words, k1=1.5, b=0.75):
     if not query_words or not sections:
         return {}
 
-    # Tokenize all sections into word lists
+    # Tokenize all sections into term-frequency tables
     docs = []
     for s in sections:
         text = (s["header"] + " " + s["body"]).lower()
-        words = [w for w in re.split(r'\W+', text) if len(w) > 2]
-        docs.append(words)
+        words = [w for w in _WORD_SPLIT_RE.split(text) if len(w) > 2]
+        docs.append((Counter(words), len(words)))
 
     N = len(docs)
-    avgdl = sum(len(d) for d in docs) / N if N > 0 else 1
+    avgdl = sum(dl for _, dl in docs) / N if N > 0 else 1
+
+    # Document frequency is per query word, not per (word, section) pair
+    df = {qw: sum(1 for tf, _ in docs if qw in tf) for qw in set(query_words)}
 
     scores = {}
-    for i, (s, doc) in enumerate(zip(sections, docs)):
+    for s, (doc_tf, dl) in zip(sections, docs):
         score = 0.0
-        dl = len(doc)
         for qw in query_words:
-            tf = doc.count(qw)
+            tf = doc_tf[qw]
             if tf == 0:
                 continue
-            df = sum(1 for d in docs if qw in d)
-            idf = math.log((N - df + 0.5) / (df + 0.5) + 1)
+            idf = math.log((N - df[qw] + 0.5) / (df[qw] + 0.5) + 1)
             term_score = idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * dl / avgdl))
             score += term_score
         scores[s["header"]] = score
@@ -755,9 +1247,8 @@ def get_core_context():
     """Load core.md - identity-critical content always injected, never pruned."""
     core_path = f"{MOBY_DIR}/core.md"
     try:
-        if os.path.exists(core_path):
-            with open(core_path) as f:
-                return f.read().strip()
+        with open(core_path) as f:
+            return f.read().strip()
     except OSError:
         pass
     return ""
@@ -774,10 +1265,11 @@ def read_inner_state():
     """Read the agent's persistent emotional/inner state."""
     state_path = f"{MOBY_DIR}/state/inner.json"
     try:
-        if os.path.exists(state_path):
-            with open(state_path) as f:
-                return json.load(f)
-    except (json.JSONDecodeError, OSError) as e:
+        with open(state_path, "rb") as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        pass
+    except (ValueError, OSError) as e:
         print(f"[inner-state] Error reading: {e}")
     return {"mood": {"primary": "neutral"}, "energy": 0.5, "preoccupations": [], "curiosity_queue": []}
 
@@ -787,9 +1279,8 @@ def write_inner_state(data):
     state_dir = f"{MOBY_DIR}/state"
     os.makedirs(state_dir, exist_ok=True)
     state_path = f"{state_dir}/inner.json"
-    data["timestamp"] = datetime.now(timezone.utc).isoformat()
-    with open(state_path, "w") as f:
-        json.dump(data, f, indent=2)
+    data["timestamp"] = now_iso()
+    atomic_write(state_path, json.dumps(data, indent=2))
 
 
 def get_inner_context():
@@ -838,15 +1329,14 @@ def get_inner_context():
 
 def get_self_model_summary():
     """Read SELF.md and return a compact summary (first ~500 chars)."""
-    self_path = f"{MOBY_DIR}/SELF.md"
+    self_path = SELF_MODEL_PATH
     try:
-        if os.path.exists(self_path):
-            with open(self_path) as f:
-                content = f.read()
-            # Return the full thing if it's under budget, otherwise truncate
-            if len(content) < 2000:
-                return content
-            return content[:2000] + "\n[... truncated ...]"
+        with open(self_path) as f:
+            content = f.read()
+        # Return the full thing if it's under budget, otherwise truncate
+        if len(content) < 2000:
+            return content
+        return content[:2000] + "\n[... truncated ...]"
     except OSError:
         pass
     return ""
@@ -871,16 +1361,14 @@ def get_optimized_context(query=None, budget_tokens=None):
         }
     """
     budget = budget_tokens or DEFAULT_CONTEXT_BUDGET
-    memory_path = f"{MOBY_DIR}/MEMORY.md"
+    memory_path = MEMORY_PATH
 
-    if not os.path.exists(memory_path):
+    content = read_text(memory_path)
+    if content is None:
         return {"sections": [], "total_tokens": 0, "budget_tokens": budget,
                 "sections_included": 0, "sections_total": 0, "sections_pruned": 0,
                 "context": ""}
 
-    with open(memory_path, "r") as f:
-        content = f.read()
-
     sections = parse_memory_sections(content)
     if not sections:
         return {"sections": [], "total_tokens": 0, "budget_tokens": budget,
@@ -890,9 +1378,10 @@ def get_optimized_context(query=None, budget_tokens=None):
     # Tokenize query for keyword matching
     query_words = []
     if query:
-        query_words = [w.lower() for w in re.split(r'\W+', query) if len(w) > 2]
+        query_words = [w.lower() for w in _WORD_SPLIT_RE.split(query) if len(w) > 2]
 
-    now_str = datetime.now(timezone.utc).isoformat()
+    # Computed once per request, not once per section
+    today = today_str()
 
     # Compute BM25 scores for semantic relevance (replaces simple keyword overlap)
     bm25 = bm25_scores(sections, query_words)
@@ -900,53 +1389,63 @@ def get_optimized_context(query=None, budget_tokens=None):
     # Score all sections (structural score + BM25 semantic score)
     scored = []
     for s in sections:
-        structural = score_section(s, query_words, now_str)
+        structural = score_section(s, query_words, today)
         semantic = bm25.get(s["header"], 0) * 60  # scale BM25 into structural range
         scored.append({**s, "score": structural + semantic, "bm25": bm25.get(s["header"], 0)})
 
-    # Sort by score descending
-    scored.sort(key=lambda x: x["score"], reverse=True)
+    # Visit sections best-first (ties in document order) straight off a heap, and stop
+    # as soon as even the smallest section could no longer fit instead of sorting them all
+    heap = [(-s["score"], i) for i, s in enumerate(scored)]
+    heapq.heapify(heap)
+    min_tokens = min(s["tokens"] for s in scored)
 
     # Pack sections within budget
-    included = []
+    chosen = [False] * len(scored)
     total_tokens = 0
-    for s in scored:
-        section_text = f"## {s['header']}\n{s['body']}"
-        section_tokens = estimate_tokens(section_text)
+    any_included = False
+    while heap and (not any_included or total_tokens + min_tokens <= budget):
+        i = heapq.heappop(heap)[1]
+        section_tokens = scored[i]["tokens"]
 
-        if total_tokens + section_tokens > budget and included:
+        if total_tokens + section_tokens > budget and any_included:
             # Over budget - skip unless it's the first section
             continue
 
-        included.append(s)
+        chosen[i] = any_included = True
         total_tokens += section_tokens
 
-    # Re-sort included by original order (preserve logical flow)
-    section_order = {s["header"]: i for i, s in enumerate(sections)}
-    included.sort(key=lambda x: section_order.get(x["header"], 999))
-
-    # Build context text
-    context_parts = []
-    for s in included:
-        context_parts.append(f"## {s['header']}\n{s['body']}")
+    # Keep included sections in original order (preserve logical flow)
+    included = [s for s, keep in zip(scored, chosen) if keep]
 
-    context_text = "\n\n".join(context_parts)
-
-    # Inject core.md (always included, never pruned - identity-critical content)
+    # Always-included prefixes: inner state first, then core.md (identity-critical, never pruned)
     core_context = get_core_context()
     if core_context:
-        context_text = f"{core_context}\n\n{context_text}"
         total_tokens += estimate_tokens(core_context) + 5
-
-    # Inject inner state (always included, not scored)
     inner_context = get_inner_context()
     if inner_context:
-        context_text = f"## Inner State (right now)\n{inner_context}\n\n{context_text}"
         total_tokens += estimate_tokens(inner_context) + 10
 
+    # Build context text in one buffer instead of join + repeated prefixing
+    buf = io.StringIO()
+    if inner_context:
+        buf.write("## Inner State (right now)\n")
+        buf.write(inner_context)
+        buf.write("\n\n")
+    if core_context:
+        buf.write(core_context)
+        buf.write("\n\n")
+    for n, s in enumerate(included):
+        if n:
+            buf.write("\n\n")
+        buf.write("## ")
+        buf.write(s["header"])
+        buf.write("\n")
+        buf.write(s["body"])
+    context_text = buf.getvalue()
+
     return {
         "sections": [{"header": s["header"], "score": s["score"],
-                       "tokens": estimate_tokens(f"## {s['header']}\n{s['body']}")} for s in included],
+                       "tokens": s["tokens"]} for s in included],
         "total_tokens": total_tokens,
         "budget_tokens": budget,
         "sections_included": len(included),
@@ -958,43 +1457,82 @@ def get_optimized_context(query=None, budget_tokens=None):
 
 # ─── Explorations API ───────────────────────────────────────
 
+_TOPIC_RE = re.compile(r'^topic:\s*(.+)$', re.MULTILINE)
+_explorations_listing = (None, [])  # (dir st_mtime_ns, .md filenames newest first)
+_exploration_cache = {}  # filename -> ((st_mtime_ns, st_size), meta, stats topic, lowercased search text)
+
+def _exploration_files(explorations_dir):
+    """Sorted (newest first) exploration filenames; re-listed only when the directory changes."""
+    global _explorations_listing
+    st = safe_stat(explorations_dir)
+    if st is None:
+        return None
+    cached_mtime, files = _explorations_listing
+    if cached_mtime != st.st_mtime_ns:
+        files = sorted((f for f in os.listdir(explorations_dir) if f.endswith(".md")), reverse=True)
+        _explorations_listing = (st.st_mtime_ns, files)
+        # Forget files that have been removed
+        for fname in _exploration_cache.keys() - set(files):
+            _exploration_cache.pop(fname, None)
+    return files
+
+def _load_exploration(explorations_dir, fname):
+    """Parsed (meta, topic, searchable) for one exploration file, re-read only when it changes.
+    searchable is the lowercased content + filename used by the query filter.
+    The meta dict is shared between callers and must not be mutated."""
+    fpath = os.path.join(explorations_dir, fname)
+    st = safe_stat(fpath)
+    if st is None:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _exploration_cache.get(fname)
+    if cached and cached[0] == key:
+        return cached[1:]
+
+    try:
+        with open(fpath) as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    # Parse frontmatter: the text between the leading "---" and the next one
+    meta = {"file": fname, "content": content}
+    if content.startswith("---"):
+        frontmatter, sep, body = content[3:].partition("---")
+        if sep:
+            for line in frontmatter.split("\n"):
+                name, sep, val = line.partition(":")
+                if sep:
+                    meta[name.strip()] = val.strip()
+            meta["body"] = body.strip()
+
+    match = _TOPIC_RE.search(content)
+    topic = match.group(1).strip() if match else None
+
+    searchable = (content + " " + fname).lower()
+
+    _exploration_cache[fname] = (key, meta, topic, searchable)
+    return meta, topic, searchable
+
+
 def get_explorations(query=None, limit=50):
     """List exploration files, optionally filtered by keyword."""
     explorations_dir = f"{MOBY_DIR}/explorations"
-    if not os.path.exists(explorations_dir):
+    files = _exploration_files(explorations_dir)
+    if files is None:
         return []
 
-    files = sorted(
-        [f for f in os.listdir(explorations_dir) if f.endswith(".md")],
-        reverse=True
-    )[:limit]
-
+    q = query.lower() if query else None
     results = []
-    for fname in files:
-        fpath = os.path.join(explorations_dir, fname)
-        try:
-            with open(fpath) as f:
-                content = f.read()
-        except:
+    for fname in files[:limit]:
+        loaded = _load_exploration(explorations_dir, fname)
+        if loaded is None:
             continue
+        meta, _, searchable = loaded
 
-        # Parse frontmatter
-        meta = {"file": fname, "content": content}
-        if content.startswith("---"):
-            parts = content.split("---", 2)
-            if len(parts) >= 3:
-                for line in parts[1].strip().split("\n"):
-                    if ":" in line:
-                        key, val = line.split(":", 1)
-                        meta[key.strip()] = val.strip()
-                meta["body"] = parts[2].strip()
-
-        # Filter by query if provided
-        if query:
-            q = query.lower()
-            searchable = (content + " " + fname).lower()
-            if q not in searchable:
-                continue
+        # Filter by query if provided, against the text lowercased at load time
+        if q and q not in searchable:
+            continue
 
         results.append(meta)
 
@@ -1005,33 +1543,27 @@ def get_exploration(filename):
     """Read a single exploration file."""
     explorations_dir = f"{MOBY_DIR}/explorations"
     fpath = os.path.join(explorations_dir, filename)
-    if not os.path.exists(fpath) or not filename.endswith(".md"):
+    if not filename.endswith(".md"):
+        return None
+    content = read_text(fpath)
+    if content is None:
         return None
-    with open(fpath) as f:
-        return {"file": filename, "content": f.read()}
+    return {"file": filename, "content": content}
 
 
+@ttl_cache(1.0)
 def get_exploration_stats():
     """Quick stats about explorations."""
     explorations_dir = f"{MOBY_DIR}/explorations"
-    if not os.path.exists(explorations_dir):
+    files = _exploration_files(explorations_dir)
+    if files is None:
         return {"count": 0, "topics": [], "latest": None}
 
-    files = sorted(
-        [f for f in os.listdir(explorations_dir) if f.endswith(".md")],
-        reverse=True
-    )
-
     topics = []
     for fname in files[:20]:
-        try:
-            with open(os.path.join(explorations_dir, fname)) as f:
-                content = f.read()
-            match = re.search(r'^topic:\s*(.+)$', content, re.MULTILINE)
-            if match:
-                topics.append(match.group(1).strip())
-        except:
-            pass
+        loaded = _load_exploration(explorations_dir, fname)
+        if loaded and loaded[1] is not None:
+            topics.append(loaded[1])
 
     return {
         "count": len(files),
@@ -1040,364 +1572,611 @@ def get_exploration_stats():
     }
 
 
+# ─── Status ─────────────────────────────────────────────────
+
+def day_bounds(day):
+    """Half-open [start, end) range matching timestamps that begin with `day` (YYYY-MM-DD).
+    Same rows as `LIKE 'day%'`, but usable as an index range scan."""
+    next_day = datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)
+    return day, next_day.strftime("%Y-%m-%d")
+
+
+@ttl_cache(1.0)
+def get_status_counts():
+    """Task counts by status plus conversation and lesson totals, in one query.
+    Cached briefly so rapid dashboard polling shares the result."""
+    task_counts = {}
+    totals = {"conv": 0, "lesson": 0}
+    with get_db(readonly=True) as conn:
+        for kind, status, cnt in conn.execute("""
+            SELECT 'task', status, COUNT(*) FROM tasks GROUP BY status
+            UNION ALL SELECT 'conv', NULL, COUNT(*) FROM conversations
+            UNION ALL SELECT 'lesson', NULL, COUNT(*) FROM lessons
+        """):
+            if kind == "task":
+                task_counts[status] = cnt
+            else:
+                totals[kind] = cnt
+    return task_counts, totals["conv"], totals["lesson"]
+
+
+@ttl_cache(1.0)
+def get_task_stats():
+    """Task counts by status and priority, plus overdue and completed-today totals."""
+    with get_db(readonly=True) as conn:
+        stats = {
+            "by_status": {},
+            "by_priority": {},
+            "overdue": 0,
+            "completed_today": 0,
+        }
+        for row in conn.execute("SELECT status, COUNT(*) as cnt FROM tasks GROUP BY status"):
+            stats["by_status"][row["status"]] = row["cnt"]
+        for row in conn.execute("SELECT priority, COUNT(*) as cnt FROM tasks GROUP BY priority"):
+            stats["by_priority"][row["priority"]] = row["cnt"]
+
+        now = now_iso()
+        today = today_str()
+        stats["overdue"] = conn.execute("SELECT COUNT(*) as cnt FROM tasks WHERE due_date < ? AND status NOT IN ('done','cancelled')", (now,)).fetchone()["cnt"]
+        stats["completed_today"] = conn.execute("SELECT COUNT(*) as cnt FROM tasks WHERE completed_at >= ? AND completed_at < ? AND status='done'", day_bounds(today)).fetchone()["cnt"]
+    return stats
+
+
+@ttl_cache(1.0)
+def get_conversation_stats():
+    """Conversation totals overall, today, and per channel."""
+    with get_db(readonly=True) as conn:
+        return {
+            "total": conn.execute("SELECT COUNT(*) as cnt FROM conversations").fetchone()["cnt"],
+            "today": conn.execute("SELECT COUNT(*) as cnt FROM conversations WHERE timestamp >= ? AND timestamp < ?",
+                day_bounds(today_str())).fetchone()["cnt"],
+            "by_channel": {row["channel"]: row["cnt"] for row in conn.execute(
+                "SELECT channel, COUNT(*) as cnt FROM conversations GROUP BY channel"
+            ).fetchall()},
+        }
+
+
+@ttl_cache(1.0)
+def get_usage_summary():
+    """Quick usage summary for the status endpoint."""
+    try:
+        with get_db(readonly=True) as conn:
+            today = today_str()
+            today_row = conn.execute(
+                "SELECT COUNT(*) as requests, COALESCE(SUM(cost), 0) as cost, "
+                "COALESCE(SUM(input_tokens), 0) as input_tokens, "
+                "COALESCE(SUM(output_tokens), 0) as output_tokens "
+                "FROM usage WHERE timestamp >= ? AND timestamp < ?",
+                day_bounds(today)
+            ).fetchone()
+            total_row = conn.execute(
+                "SELECT COUNT(*) as requests, COALESCE(SUM(cost), 0) as cost "
+                "FROM usage"
+            ).fetchone()
+        return {
+            "today": dict(today_row) if today_row else {},
+            "total": dict(total_row) if total_row else {},
+        }
+    except Exception:
+        return {}
+
+
+def invalidate_stats():
+    """Drop the cached dashboard aggregates after a write so the next poll sees it."""
+    for cached in (get_status_counts, get_task_stats, get_conversation_stats, get_usage_summary):
+        cached.cache_clear()
+
+
+# ─── File Stats ─────────────────────────────────────────────
+
+def safe_stat(path):
+    """os.stat() that returns None for a missing or unreadable path."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def read_text(path):
+    """Contents of a text file, or None if it doesn't exist.
+    Opens directly instead of checking os.path.exists() first, and decodes
+    the raw bytes in one pass rather than through a text-mode wrapper."""
+    try:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8")
+    except FileNotFoundError:
+        return None
+    if "\r" in text:  # keep text-mode universal newlines
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+_line_count_cache = {}  # path -> ((mtime_ns, size), lines)
+
+def count_lines(path, st=None):
+    """Count lines in a file, re-reading it only when its mtime or size changes."""
+    st = st or os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _line_count_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, "rb") as f:
+        data = f.read()
+    lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        lines += 1  # unterminated last line
+    _line_count_cache[path] = (key, lines)
+    return lines
+
+
+_tunnel_cache = (None, None)  # ((mtime_ns, size), parsed tunnel-info.json)
+
+def read_tunnel_info():
+    """Parsed tunnel-info.json, or None when the tunnel has not written one.
+    Re-parsed only when the file changes; the returned dict is shared, don't mutate it."""
+    global _tunnel_cache
+    st = safe_stat(TUNNEL_INFO_PATH)
+    if st is None:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached_key, info = _tunnel_cache
+    if cached_key == key:
+        return info
+    try:
+        with open(TUNNEL_INFO_PATH, "rb") as f:
+            info = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    _tunnel_cache = (key, info)
+    return info
+
+
+_page_cache = {}  # filename -> (mtime_ns, body, etag)
+
+def load_page(filename):
+    """Return (body, etag) for a static page, re-reading it only when its mtime changes."""
+    filepath = os.path.join(STATIC_DIR, filename)
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    cached = _page_cache.get(filename)
+    if cached and cached[0] == st.st_mtime_ns:
+        return cached[1], cached[2]
+    with open(filepath, "rb") as f:
+        body = f.read()
+    etag = f'"{st.st_mtime_ns:x}-{len(body):x}"'
+    _page_cache[filename] = (st.st_mtime_ns, body, etag)
+    return body, etag
+
+
 # ─── Settings API ───────────────────────────────────────────
 
 def get_settings():
+    memory_st = safe_stat(MEMORY_PATH)
+    db_st = safe_stat(DB_PATH)
     settings = {
         "moby_dir": MOBY_DIR,
         "db_path": DB_PATH,
         "gateway_url": GATEWAY_URL,
-        "memory_size": os.path.getsize(f"{MOBY_DIR}/MEMORY.md") if os.path.exists(f"{MOBY_DIR}/MEMORY.md") else 0,
+        "memory_size": memory_st.st_size if memory_st else 0,
         "lessons_count": len(get_lessons()),
-        "db_size": os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else 0,
+        "db_size": db_st.st_size if db_st else 0,
     }
-    tunnel_info = f"{MOBY_DIR}/data/tunnel-info.json"
-    if os.path.exists(tunnel_info):
-        with open(tunnel_info) as f:
-            settings["tunnel"] = json.load(f)
+    tunnel = read_tunnel_info()
+    if tunnel is not None:
+        settings["tunnel"] = tunnel
     return settings
 
 # ─── HTTP Handler ───────────────────────────────────────────
 
+def resolve_route(routes, patterns, path):
+    """Look up a handler for path: exact match first, then regex patterns.
+    Returns (handler, captured_args) or None."""
+    handler = routes.get(path)
+    if handler is not None:
+        return handler, ()
+    for pattern, handler in patterns:
+        m = pattern.match(path)
+        if m:
+            return handler, m.groups()
+    return None
+
+
 class DashboardHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep-alive: dashboard polling reuses one connection. Every response must
+    # therefore carry Content-Length (or be a 304), and idle sockets time out.
+    protocol_version = "HTTP/1.1"
+    timeout = 30
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=STATIC_DIR, **kwargs)
 
     def do_GET(self):
         parsed = urlparse(self.path)
-        path = parsed.path
-        params = parse_qs(parsed.query)
-
-        # API routes
-        if path == "/api/status":
-            self.send_json(self.get_status())
-        elif path == "/api/settings":
-            self.send_json(get_settings())
-
-        # Task API
-        elif path == "/api/tasks/stats":
-            self.send_json(self.get_task_stats())
-        elif path == "/api/tasks":
-            filters = {}
-            if "status" in params: filters["status"] = params["status"]
-            if "priority" in params: filters["priority"] = params["priority"][0]
-            if "tag" in params: filters["tag"] = params["tag"][0]
-            if "parent_id" in params: filters["parent_id"] = params["parent_id"][0]
-            self.send_json(get_tasks(filters if filters else None))
-        elif path.startswith("/api/tasks/") and path.count("/") == 3:
-            task_id = path.split("/")[-1]
-            task = get_task(task_id)
-            if task:
-                self.send_json(task)
-            else:
-                self.send_json({"error": "Not found"}, 404)
-
-        # Conversation API
-        elif path == "/api/conversations":
-            query = params.get("q", [None])[0]
-            channel = params.get("channel", [None])[0]
-            limit = int(params.get("limit", ["50"])[0])
-            conn = get_db()
-            if query:
-                results = [dict(row) for row in conn.execute(
-                    "SELECT * FROM conversations WHERE summary LIKE ? OR topics LIKE ? OR key_facts LIKE ? ORDER BY timestamp DESC LIMIT ?",
-                    (f"%{query}%", f"%{query}%", f"%{query}%", limit)
-                ).fetchall()]
-            elif channel:
+        route = resolve_route(self.GET_ROUTES, self.GET_PATTERNS, parsed.path)
+        if route is None:
+            super().do_GET()
+            return
+        handler, args = route
+        handler(self, parse_qs(parsed.query), *args)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.read_body()
+        route = resolve_route(self.POST_ROUTES, self.POST_PATTERNS, path)
+        if route is None:
+            self.send_json({"error": "Not found"}, 404)
+            return
+        handler, args = route
+        handler(self, body, *args)
+
+    def do_PUT(self):
+        path = urlparse(self.path).path
+        body = self.read_body()
+        route = resolve_route(self.PUT_ROUTES, self.PUT_PATTERNS, path)
+        if route is None:
+            self.send_json({"error": "Not found"}, 404)
+            return
+        handler, args = route
+        handler(self, body, *args)
+
+    def do_DELETE(self):
+        path = urlparse(self.path).path
+        route = resolve_route(self.DELETE_ROUTES, self.DELETE_PATTERNS, path)
+        if route is None:
+            self.send_json({"error": "Not found"}, 404)
+            return
+        handler, args = route
+        handler(self, *args)
+
+    # ─── GET handlers ───────────────────────────────────────
+
+    def handle_get_status(self, params):
+        self.send_json(self.get_status())
+
+    def handle_get_settings(self, params):
+        self.send_json(get_settings())
+
+    # Task API
+    def handle_get_task_stats(self, params):
+        self.send_json(get_task_stats())
+
+    def handle_get_tasks(self, params):
+        filters = {}
+        if "status" in params: filters["status"] = params["status"]
+        if "priority" in params: filters["priority"] = params["priority"][0]
+        if "tag" in params: filters["tag"] = params["tag"][0]
+        if "parent_id" in params: filters["parent_id"] = params["parent_id"][0]
+        self.send_json(get_tasks(filters if filters else None))
+
+    def handle_get_task(self, params, task_id):
+        task = get_task(task_id)
+        if task:
+            self.send_json(task)
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    # Task dependency API
+    def handle_get_task_deps(self, params, task_id):
+        result = check_dependencies(task_id)
+        if result:
+            self.send_json(result)
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    def handle_get_blocked_tasks(self, params):
+        self.send_json(get_blocked_tasks())
+
+    # Conversation API
+    def handle_get_conversations(self, params):
+        query = params.get("q", [None])[0]
+        channel = params.get("channel", [None])[0]
+        limit = int(params.get("limit", ["50"])[0])
+        if query:
+            results = search_conversations(query, limit)
+        elif channel:
+            with get_db(readonly=True) as conn:
                 results = [dict(row) for row in conn.execute(
                     "SELECT * FROM conversations WHERE channel=? ORDER BY timestamp DESC LIMIT ?",
                     (channel, limit)
-                ).fetchall()]
-            else:
+                )]
+        else:
+            with get_db(readonly=True) as conn:
                 results = [dict(row) for row in conn.execute(
                     "SELECT * FROM conversations ORDER BY timestamp DESC LIMIT ?", (limit,)
-                ).fetchall()]
-            conn.close()
-            self.send_json(results)
-        elif path == "/api/conversations/stats":
-            conn = get_db()
-            stats = {
-                "total": conn.execute("SELECT COUNT(*) as cnt FROM conversations").fetchone()["cnt"],
-                "today": conn.execute("SELECT COUNT(*) as cnt FROM conversations WHERE timestamp LIKE ?",
-                    (datetime.now(timezone.utc).strftime("%Y-%m-%d") + "%",)).fetchone()["cnt"],
-                "by_channel": {row["channel"]: row["cnt"] for row in conn.execute(
-                    "SELECT channel, COUNT(*) as cnt FROM conversations GROUP BY channel"
-                ).fetchall()},
-            }
-            conn.close()
-            self.send_json(stats)
-
-        # Lessons API
-        elif path == "/api/lessons":
-            category = params.get("category", [None])[0]
-            self.send_json(get_lessons(category))
-
-        # Memory API
-        elif path == "/api/memory":
-            memory_path = f"{MOBY_DIR}/MEMORY.md"
-            if os.path.exists(memory_path):
-                with open(memory_path) as f:
-                    self.send_json({"content": f.read()})
-            else:
-                self.send_json({"content": ""})
-
-        # Soul.yaml API
-        elif path == "/api/soul":
-            self.send_json(read_soul_yaml())
-
-        # Task dependency API
-        elif path.startswith("/api/tasks/") and path.endswith("/deps"):
-            task_id = path.split("/")[-2]
-            result = check_dependencies(task_id)
-            if result:
-                self.send_json(result)
-            else:
-                self.send_json({"error": "Not found"}, 404)
-        elif path == "/api/tasks/blocked":
-            self.send_json(get_blocked_tasks())
-
-        # Inner State API
-        elif path == "/api/inner-state":
-            self.send_json(read_inner_state())
-        elif path == "/api/self-model":
-            self_path = f"{MOBY_DIR}/SELF.md"
-            if os.path.exists(self_path):
-                with open(self_path) as f:
-                    self.send_json({"content": f.read()})
-            else:
-                self.send_json({"content": ""})
-        elif path == "/api/journal":
-            day = params.get("date", [datetime.now(timezone.utc).strftime("%Y-%m-%d")])[0]
-            journal_path = f"{MOBY_DIR}/journal/{day}.md"
-            if os.path.exists(journal_path):
-                with open(journal_path) as f:
-                    self.send_json({"date": day, "content": f.read()})
-            else:
-                self.send_json({"date": day, "content": ""})
-
-        # Explorations API
-        elif path == "/api/explorations":
-            query = params.get("q", [None])[0]
-            limit = int(params.get("limit", ["50"])[0])
-            self.send_json(get_explorations(query, limit))
-        elif path == "/api/explorations/stats":
-            self.send_json(get_exploration_stats())
-        elif path.startswith("/api/explorations/") and path.count("/") == 3:
-            filename = path.split("/")[-1]
-            result = get_exploration(filename)
-            if result:
-                self.send_json(result)
-            else:
-                self.send_json({"error": "Not found"}, 404)
-
-        # Context Window Optimizer
-        elif path == "/api/context":
-            query = params.get("query", [None])[0]
-            budget = int(params.get("budget", [str(DEFAULT_CONTEXT_BUDGET)])[0])
-            self.send_json(get_optimized_context(query, budget))
-
-        # Usage API
-        elif path == "/api/usage":
-            limit = int(params.get("limit", ["50"])[0])
-            self.send_json(get_usage_recent(limit))
-        elif path == "/api/usage/stats":
-            days = params.get("days", [None])[0]
-            channel = params.get("channel", [None])[0]
-            days = int(days) if days else None
-            self.send_json(get_usage_stats(days, channel))
-
-        # Auto-retry status
-        elif path == "/api/retry/status":
-            conn = get_db()
-            failed = conn.execute(
-                "SELECT id, title, retry_count, max_retries FROM tasks WHERE status='failed'"
-            ).fetchall()
-            eligible = conn.execute(
-                "SELECT id, title, retry_count, max_retries FROM tasks WHERE status='failed' AND retry_count < max_retries"
-            ).fetchall()
-            conn.close()
-            self.send_json({
-                "auto_retry_interval": AUTO_RETRY_INTERVAL,
-                "failed_total": len(failed),
-                "eligible_for_retry": len(eligible),
-                "failed_tasks": [dict(r) for r in failed],
-                "eligible_tasks": [dict(r) for r in eligible]
-            })
+                )]
+        self.send_json(results)
 
-        # Tunnel info
-        elif path == "/api/tunnel":
-            tunnel_info = f"{MOBY_DIR}/data/tunnel-info.json"
-            if os.path.exists(tunnel_info):
-                with open(tunnel_info) as f:
-                    self.send_json(json.load(f))
-            else:
-                self.send_json({"url": None, "status": "not running"})
+    def handle_get_conversation_stats(self, params):
+        self.send_json(get_conversation_stats())
 
-        # Dashboard pages
-        elif path == "/tasks":
-            self.serve_page("tasks.html")
-        elif path == "/usage":
-            self.serve_page("usage.html")
-        elif path == "/settings":
-            self.serve_page("settings.html")
+    # Lessons API
+    def handle_get_lessons(self, params):
+        category = params.get("category", [None])[0]
+        self.send_json(get_lessons(category))
+
+    # Memory API
+    def handle_get_memory(self, params):
+        self.send_json({"content": read_text(MEMORY_PATH) or ""})
+
+    def handle_get_memory_raw(self, params):
+        self.send_file(MEMORY_PATH, "text/markdown; charset=utf-8")
+
+    # Soul.yaml API
+    def handle_get_soul(self, params):
+        self.send_json(read_soul_yaml())
+
+    # Inner State API
+    def handle_get_inner_state(self, params):
+        self.send_json(read_inner_state())
+
+    def handle_get_self_model(self, params):
+        self.send_json({"content": read_text(SELF_MODEL_PATH) or ""})
+
+    def handle_get_journal(self, params):
+        day = params.get("date", [today_str()])[0]
+        journal_path = f"{MOBY_DIR}/journal/{day}.md"
+        self.send_json({"date": day, "content": read_text(journal_path) or ""})
+
+    # Explorations API
+    def handle_get_explorations(self, params):
+        query = params.get("q", [None])[0]
+        limit = int(params.get("limit", ["50"])[0])
+        self.send_json(get_explorations(query, limit))
+
+    def handle_get_exploration_stats(self, params):
+        self.send_json(get_exploration_stats())
+
+    def handle_get_exploration(self, params, filename):
+        result = get_exploration(filename)
+        if result:
+            self.send_json(result)
         else:
-            super().do_GET()
+            self.send_json({"error": "Not found"}, 404)
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        body = self.read_body()
+    # Context Window Optimizer
+    def handle_get_context(self, params):
+        query = params.get("query", [None])[0]
+        budget = int(params.get("budget", [str(DEFAULT_CONTEXT_BUDGET)])[0])
+        self.send_json(get_optimized_context(query, budget))
+
+    # Usage API
+    def handle_get_usage(self, params):
+        limit = int(params.get("limit", ["50"])[0])
+        self.send_json(get_usage_recent(limit))
+
+    def handle_get_usage_stats(self, params):
+        days = params.get("days", [None])[0]
+        channel = params.get("channel", [None])[0]
+        days = int(days) if days else 0
+        # Clamp so arbitrary query values can't each become a separate cache entry (0 = all time)
+        days = min(max(days, 0), MAX_USAGE_STATS_DAYS) or None
+        self.send_json(get_usage_stats(days, channel or None))
+
+    # Auto-retry status
+    def handle_get_retry_status(self, params):
+        failed = []
+        eligible = []
+        with get_db(readonly=True) as conn:
+            # One pass over the failed rows; eligibility is evaluated by SQLite (NULL-safe)
+            for task_id, title, retry_count, max_retries, can_retry in conn.execute(
+                "SELECT id, title, retry_count, max_retries, retry_count < max_retries FROM tasks WHERE status='failed'"
+            ):
+                task = {"id": task_id, "title": title, "retry_count": retry_count, "max_retries": max_retries}
+                failed.append(task)
+                if can_retry:
+                    eligible.append(task)
+        self.send_json({
+            "auto_retry_interval": AUTO_RETRY_INTERVAL,
+            "failed_total": len(failed),
+            "eligible_for_retry": len(eligible),
+            "failed_tasks": failed,
+            "eligible_tasks": eligible
+        })
 
-        if path == "/api/tasks":
-            task = create_task(body)
-            self.send_json(task, 201)
-        elif path.startswith("/api/tasks/") and path.endswith("/retry"):
-            task_id = path.split("/")[-2]
-            result = retry_task(task_id)
-            if result:
-                self.send_json(result)
-            else:
-                self.send_json({"error": "Not found"}, 404)
-        elif path == "/api/conversations":
-            log_conversation(body)
-            self.send_json({"ok": True}, 201)
-        elif path == "/api/lessons":
-            add_lesson(body)
-            self.send_json({"ok": True}, 201)
-        elif path == "/api/memory/compress":
-            result = compress_memory()
+    # Tunnel info
+    def handle_get_tunnel(self, params):
+        tunnel = read_tunnel_info()
+        if tunnel is not None:
+            self.send_json(tunnel)
+        else:
+            self.send_json({"url": None, "status": "not running"})
+
+    # ─── POST / PUT / DELETE handlers ───────────────────────
+
+    def handle_post_tasks(self, body):
+        task = create_task(body)
+        self.send_json(task, 201)
+
+    def handle_post_task_retry(self, body, task_id):
+        result = retry_task(task_id)
+        if result:
             self.send_json(result)
-        elif path == "/api/memory":
-            memory_path = f"{MOBY_DIR}/MEMORY.md"
-            with open(memory_path, "w") as f:
-                f.write(body.get("content", ""))
-            self.send_json({"ok": True})
-        elif path == "/api/soul":
-            result = write_soul_yaml(body.get("content", ""))
-            if "error" in result:
-                self.send_json(result, 400)
-            else:
-                self.send_json(result)
-        elif path == "/api/retry/run":
-            retried = auto_retry_failed_tasks()
-            self.send_json({"retried": retried, "count": len(retried)})
-        elif path == "/api/usage":
-            log_usage(body)
-            self.send_json({"ok": True}, 201)
-        elif path == "/api/inner-state":
-            write_inner_state(body)
-            self.send_json({"ok": True})
-        elif path == "/api/self-model":
-            self_path = f"{MOBY_DIR}/SELF.md"
-            with open(self_path, "w") as f:
-                f.write(body.get("content", ""))
-            self.send_json({"ok": True})
-        elif path == "/api/journal":
-            day = body.get("date", datetime.now(timezone.utc).strftime("%Y-%m-%d"))
-            journal_dir = f"{MOBY_DIR}/journal"
-            os.makedirs(journal_dir, exist_ok=True)
-            journal_path = f"{journal_dir}/{day}.md"
-            mode = body.get("mode", "append")
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    def handle_post_conversations(self, body):
+        log_conversation(body)
+        self.send_json({"ok": True}, 201)
+
+    def handle_post_lessons(self, body):
+        add_lesson(body)
+        self.send_json({"ok": True}, 201)
+
+    def handle_post_memory_compress(self, body):
+        result = compress_memory()
+        self.send_json(result)
+
+    def handle_post_memory(self, body):
+        memory_path = MEMORY_PATH
+        with _file_write_lock, open(memory_path, "w") as f:
+            f.write(body.get("content", ""))
+        self.send_json({"ok": True})
+
+    def handle_post_soul(self, body):
+        result = write_soul_yaml(body.get("content", ""))
+        if "error" in result:
+            self.send_json(result, 400)
+        else:
+            self.send_json(result)
+
+    def handle_post_retry_run(self, body):
+        retried = auto_retry_failed_tasks()
+        self.send_json({"retried": retried, "count": len(retried)})
+
+    def handle_post_usage(self, body):
+        log_usage(body)
+        self.send_json({"ok": True}, 201)
+
+    def handle_post_inner_state(self, body):
+        write_inner_state(body)
+        self.send_json({"ok": True})
+
+    def handle_post_self_model(self, body):
+        self_path = SELF_MODEL_PATH
+        with _file_write_lock, open(self_path, "w") as f:
+            f.write(body.get("content", ""))
+        self.send_json({"ok": True})
+
+    def handle_post_journal(self, body):
+        day = body.get("date", today_str())
+        journal_dir = f"{MOBY_DIR}/journal"
+        os.makedirs(journal_dir, exist_ok=True)
+        journal_path = f"{journal_dir}/{day}.md"
+        mode = body.get("mode", "append")
+        with _file_write_lock:
             if mode == "append" and os.path.exists(journal_path):
                 with open(journal_path, "a") as f:
                     f.write("\n" + body.get("content", ""))
             else:
                 with open(journal_path, "w") as f:
                     f.write(body.get("content", ""))
-            self.send_json({"ok": True})
-        elif path == "/api/tunnel/start":
-            pid_file = f"{MOBY_DIR}/data/tunnel.pid"
-            # Check if already running
-            if os.path.exists(pid_file):
-                try:
-                    with open(pid_file) as f:
-                        pid = int(f.read().strip())
-                    os.kill(pid, 0)  # Check if process exists
-                    tunnel_info = f"{MOBY_DIR}/data/tunnel-info.json"
-                    if os.path.exists(tunnel_info):
-                        with open(tunnel_info) as f:
-                            info = json.load(f)
-                        self.send_json({"status": "already running", "url": info.get("url")})
-                    else:
-                        self.send_json({"status": "already running"})
-                    return
-                except (OSError, ValueError):
-                    pass  # Process dead, continue to start
-            # Start tunnel in background
-            script = "/app/scripts/start-tunnel.sh"
-            subprocess.Popen([script, MOBY_DIR, "7777"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self.send_json({"status": "starting", "message": "Tunnel starting - URL will be sent via Telegram when ready"})
-
-        else:
-            self.send_json({"error": "Not found"}, 404)
-
-    def do_PUT(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        body = self.read_body()
+        self.send_json({"ok": True})
 
-        if path.startswith("/api/tasks/"):
-            task_id = path.split("/")[-1]
-            task = update_task(task_id, body)
-            if task is None:
-                self.send_json({"error": "Not found"}, 404)
-            elif "error" in task:
-                self.send_json(task, 409)
+    def handle_post_tunnel_start(self, body):
+        pid_file = f"{MOBY_DIR}/data/tunnel.pid"
+        # Check if already running
+        try:
+            with open(pid_file) as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0)  # Check if process exists
+            info = read_tunnel_info()
+            if info is not None:
+                self.send_json({"status": "already running", "url": info.get("url")})
             else:
-                self.send_json(task)
-        else:
+                self.send_json({"status": "already running"})
+            return
+        except (OSError, ValueError):
+            pass  # No pid file or process dead, continue to start
+        # Start tunnel in background
+        script = "/app/scripts/start-tunnel.sh"
+        subprocess.Popen([script, MOBY_DIR, "7777"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.send_json({"status": "starting", "message": "Tunnel starting - URL will be sent via Telegram when ready"})
+
+    def handle_put_task(self, body, task_id):
+        task = update_task(task_id, body)
+        if task is None:
             self.send_json({"error": "Not found"}, 404)
+        elif "error" in task:
+            self.send_json(task, 409)
+        else:
+            self.send_json(task)
+
+    def handle_delete_task(self, task_id):
+        delete_task(task_id)
+        self.send_json({"ok": True})
+
+    # ─── Route tables ───────────────────────────────────────
+    # Exact paths are a dict lookup; the few parameterized paths are tried in order after.
+
+    GET_ROUTES = {
+        "/api/status": handle_get_status,
+        "/api/settings": handle_get_settings,
+        "/api/tasks": handle_get_tasks,
+        "/api/tasks/stats": handle_get_task_stats,
+        "/api/tasks/blocked": handle_get_blocked_tasks,
+        "/api/conversations": handle_get_conversations,
+        "/api/conversations/stats": handle_get_conversation_stats,
+        "/api/lessons": handle_get_lessons,
+        "/api/memory": handle_get_memory,
+        "/api/memory/raw": handle_get_memory_raw,
+        "/api/soul": handle_get_soul,
+        "/api/inner-state": handle_get_inner_state,
+        "/api/self-model": handle_get_self_model,
+        "/api/journal": handle_get_journal,
+        "/api/explorations": handle_get_explorations,
+        "/api/explorations/stats": handle_get_exploration_stats,
+        "/api/context": handle_get_context,
+        "/api/usage": handle_get_usage,
+        "/api/usage/stats": handle_get_usage_stats,
+        "/api/retry/status": handle_get_retry_status,
+        "/api/tunnel": handle_get_tunnel,
+        # Dashboard pages
+        "/tasks": lambda self, params: self.serve_page("tasks.html"),
+        "/usage": lambda self, params: self.serve_page("usage.html"),
+        "/settings": lambda self, params: self.serve_page("settings.html"),
+    }
+    GET_PATTERNS = [
+        (re.compile(r"^/api/tasks/([^/]+)$"), handle_get_task),
+        (re.compile(r"^/api/tasks/([^/]+)/deps$"), handle_get_task_deps),
+        (re.compile(r"^/api/explorations/([^/]+)$"), handle_get_exploration),
+    ]
+
+    POST_ROUTES = {
+        "/api/tasks": handle_post_tasks,
+        "/api/conversations": handle_post_conversations,
+        "/api/lessons": handle_post_lessons,
+        "/api/memory/compress": handle_post_memory_compress,
+        "/api/memory": handle_post_memory,
+        "/api/soul": handle_post_soul,
+        "/api/retry/run": handle_post_retry_run,
+        "/api/usage": handle_post_usage,
+        "/api/inner-state": handle_post_inner_state,
+        "/api/self-model": handle_post_self_model,
+        "/api/journal": handle_post_journal,
+        "/api/tunnel/start": handle_post_tunnel_start,
+    }
+    POST_PATTERNS = [
+        (re.compile(r"^/api/tasks/([^/]+)/retry$"), handle_post_task_retry),
+    ]
 
-    def do_DELETE(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
+    PUT_ROUTES = {}
+    PUT_PATTERNS = [
+        (re.compile(r"^/api/tasks/([^/]+)$"), handle_put_task),
+    ]
 
-        if path.startswith("/api/tasks/"):
-            task_id = path.split("/")[-1]
-            delete_task(task_id)
-            self.send_json({"ok": True})
-        else:
-            self.send_json({"error": "Not found"}, 404)
+    DELETE_ROUTES = {}
+    DELETE_PATTERNS = [
+        (re.compile(r"^/api/tasks/([^/]+)$"), handle_delete_task),
+    ]
 
     def read_body(self):
         length = int(self.headers.get("Content-Length", 0))
         if length:
-            return json.loads(self.rfile.read(length))
+            return json_loads(self.rfile.read(length))
         return {}
 
     def get_status(self):
-        conn = get_db()
-        task_counts = {}
-        for row in conn.execute("SELECT status, COUNT(*) as cnt FROM tasks GROUP BY status"):
-            task_counts[row["status"]] = row["cnt"]
+        task_counts, conv_count, lesson_count = get_status_counts()
         total_tasks = sum(task_counts.values())
-        conv_count = conn.execute("SELECT COUNT(*) as cnt FROM conversations").fetchone()["cnt"]
-        lesson_count = conn.execute("SELECT COUNT(*) as cnt FROM lessons").fetchone()["cnt"]
-        conn.close()
 
         # Read tunnel info
-        tunnel_url = None
-        tunnel_info = f"{MOBY_DIR}/data/tunnel-info.json"
-        if os.path.exists(tunnel_info):
-            try:
-                with open(tunnel_info) as f:
-                    tunnel_url = json.load(f).get("url")
-            except:
-                pass
+        tunnel = read_tunnel_info()
+        tunnel_url = tunnel.get("url") if isinstance(tunnel, dict) else None
 
         # Check memory size
         memory_size = 0
         memory_lines = 0
-        memory_path = f"{MOBY_DIR}/MEMORY.md"
-        if os.path.exists(memory_path):
-            memory_size = os.path.getsize(memory_path)
-            with open(memory_path) as f:
-                memory_lines = sum(1 for _ in f)
+        memory_st = safe_stat(MEMORY_PATH)
+        if memory_st:
+            memory_size = memory_st.st_size
+            memory_lines = count_lines(MEMORY_PATH, memory_st)
 
         return {
             "agent": "mobyclaw",
             "status": "online",
-            "timestamp": datetime.now(timezone.utc).isoformat() + "Z",
+            "timestamp": now_iso() + "Z",
             "tasks": task_counts,
             "total_tasks": total_tasks,
             "conversations_indexed": conv_count,
@@ -1405,72 +2184,64 @@ class DashboardHandler(http.server.SimpleHTTPRequestHandler):
             "tunnel_url": tunnel_url,
             "memory_size": memory_size,
             "memory_lines": memory_lines,
-            "usage": self.get_usage_summary(),
+            "usage": get_usage_summary(),
         }
 
-    def get_usage_summary(self):
-        """Quick usage summary for the status endpoint."""
-        try:
-            conn = get_db()
-            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            today_row = conn.execute(
-                "SELECT COUNT(*) as requests, COALESCE(SUM(cost), 0) as cost, "
-                "COALESCE(SUM(input_tokens), 0) as input_tokens, "
-                "COALESCE(SUM(output_tokens), 0) as output_tokens "
-                "FROM usage WHERE timestamp LIKE ?",
-                (f"{today}%",)
-            ).fetchone()
-            total_row = conn.execute(
-                "SELECT COUNT(*) as requests, COALESCE(SUM(cost), 0) as cost "
-                "FROM usage"
-            ).fetchone()
-            conn.close()
-            return {
-                "today": dict(today_row) if today_row else {},
-                "total": dict(total_row) if total_row else {},
-            }
-        except Exception:
-            return {}
-
-    def get_task_stats(self):
-        conn = get_db()
-        stats = {
-            "by_status": {},
-            "by_priority": {},
-            "overdue": 0,
-            "completed_today": 0,
-        }
-        for row in conn.execute("SELECT status, COUNT(*) as cnt FROM tasks GROUP BY status"):
-            stats["by_status"][row["status"]] = row["cnt"]
-        for row in conn.execute("SELECT priority, COUNT(*) as cnt FROM tasks GROUP BY priority"):
-            stats["by_priority"][row["priority"]] = row["cnt"]
-
-        now = datetime.now(timezone.utc).isoformat()
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        stats["overdue"] = conn.execute("SELECT COUNT(*) as cnt FROM tasks WHERE due_date < ? AND status NOT IN ('done','cancelled')", (now,)).fetchone()["cnt"]
-        stats["completed_today"] = conn.execute("SELECT COUNT(*) as cnt FROM tasks WHERE completed_at LIKE ? AND status='done'", (f"{today}%",)).fetchone()["cnt"]
-        conn.close()
-        return stats
-
     def serve_page(self, filename):
-        filepath = os.path.join(STATIC_DIR, filename)
-        if os.path.exists(filepath):
-            with open(filepath, "rb") as f:
-                content = f.read()
-            self.send_response(200)
-            self.send_header("Content-Type", "text/html")
-            self.send_header("Content-Length", len(content))
-            self.end_headers()
-            self.wfile.write(content)
-        else:
+        page = load_page(filename)
+        if page is None:
             self.send_response(404)
+            self.send_header("Content-Length", 0)
+            self.end_headers()
+            return
+        content, etag = page
+        # Let the browser reuse the page for a few seconds, then revalidate by ETag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "max-age=5")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", len(content))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "max-age=5")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_file(self, filepath, content_type):
+        """Stream a file as the response body without loading it into memory.
+        A missing file is sent as a 404 JSON error."""
+        try:
+            f = open(filepath, "rb")
+        except FileNotFoundError:
+            self.send_json({"error": "Not found"}, 404)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Content-Length", size)
             self.end_headers()
+            sent = self.connection.sendfile(f, 0, size)
+        if sent != size:
+            # Truncated while sending: the body is shorter than advertised,
+            # so end the keep-alive connection rather than leave the client waiting
+            self.close_connection = True
 
     def send_json(self, data, code=200):
-        body = json.dumps(data, indent=2, default=str).encode()
+        body = encode_response(data)
+        gzipped = len(body) >= GZIP_MIN_SIZE and accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
         self.send_response(code)
         self.send_header("Content-Type", "application/json")
         self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
         self.send_header("Content-Length", len(body))
         self.end_headers()
         self.wfile.write(body)
@@ -1480,6 +2251,7 @@ class DashboardHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", 0)
         self.end_headers()
 
     def log_message(self, format, *args):
@@ -1489,7 +2261,8 @@ class DashboardHandler(http.server.SimpleHTTPRequestHandler):
 if __name__ == "__main__":
     init_db()
     start_auto_retry_thread()
-    server = http.server.HTTPServer(("0.0.0.0", PORT), DashboardHandler)
+    start_db_optimize_thread()
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", PORT), DashboardHandler)
     print(f"mobyclaw dashboard running on http://0.0.0.0:{PORT}")
     print(f"  DB: {DB_PATH}")
     print(f"  Static: {STATIC_DIR}")